@@ -0,0 +1,33 @@
+"""user loans index
+
+Revision ID: 0a9d3e5f7c21
+Revises: f41b6c8e2d05
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a9d3e5f7c21'
+down_revision: Union[str, None] = 'f41b6c8e2d05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # (user_id, id) покрывает и поиск по user_id, поэтому одноколоночный индекс удаляется после постройки нового
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_loans_user_id_id', 'book_loans', ['user_id', 'id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_book_loans_user_id', table_name='book_loans', postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_loans_user_id', 'book_loans', ['user_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+        op.drop_index('ix_book_loans_user_id_id', table_name='book_loans', postgresql_concurrently=True,
+                      if_exists=True)
@@ -0,0 +1,40 @@
+"""search vectors
+
+Revision ID: 5f3c9e2a1b7d
+Revises: a078bfb8d530
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '5f3c9e2a1b7d'
+down_revision: Union[str, None] = 'a078bfb8d530'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+                    "setweight(to_tsvector('simple', coalesce(description, '')), 'B')", persisted=True),
+        nullable=True))
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], unique=False, postgresql_using='gin')
+    op.add_column('authors', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed("setweight(to_tsvector('simple', coalesce(name, '')), 'A') || "
+                    "setweight(to_tsvector('simple', coalesce(biography, '')), 'B')", persisted=True),
+        nullable=True))
+    op.create_index('ix_authors_search_vector', 'authors', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_authors_search_vector', table_name='authors', postgresql_using='gin')
+    op.drop_column('authors', 'search_vector')
+    op.drop_index('ix_books_search_vector', table_name='books', postgresql_using='gin')
+    op.drop_column('books', 'search_vector')
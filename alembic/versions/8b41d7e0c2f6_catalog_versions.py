@@ -0,0 +1,30 @@
+"""catalog versions
+
+Revision ID: 8b41d7e0c2f6
+Revises: 5f3c9e2a1b7d
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b41d7e0c2f6'
+down_revision: Union[str, None] = '5f3c9e2a1b7d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ('books', 'authors', 'genres')
+
+
+def upgrade() -> None:
+    for table in TABLES:
+        op.execute(sa.schema.CreateSequence(sa.Sequence(f'{table}_version_seq')))
+
+
+def downgrade() -> None:
+    for table in TABLES:
+        op.execute(sa.schema.DropSequence(sa.Sequence(f'{table}_version_seq')))
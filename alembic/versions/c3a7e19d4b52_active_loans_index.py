@@ -0,0 +1,32 @@
+"""active loans index
+
+Revision ID: c3a7e19d4b52
+Revises: 8b41d7e0c2f6
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a7e19d4b52'
+down_revision: Union[str, None] = '8b41d7e0c2f6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в book_loans, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_loans_user_id_active', 'book_loans', ['user_id'], unique=False,
+                        postgresql_where=sa.text('actual_return_date IS NULL'), postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_book_loans_user_id_active', table_name='book_loans', postgresql_concurrently=True,
+                      if_exists=True)
@@ -0,0 +1,38 @@
+"""lookup indexes
+
+Revision ID: e8d2f4a6b913
+Revises: c3a7e19d4b52
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8d2f4a6b913'
+down_revision: Union[str, None] = 'c3a7e19d4b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = (
+    ('ix_book_loans_user_id', 'book_loans', ['user_id']),
+    ('ix_book_loans_book_id', 'book_loans', ['book_id']),
+    ('ix_book_loans_estimated_return_date', 'book_loans', ['estimated_return_date']),
+    ('ix_books_genres_genre_id', 'books_genres', ['genre_id', 'book_id']),
+    ('ix_books_authors_book_id', 'books_authors', ['book_id', 'author_id']),
+)
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в таблицы, но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
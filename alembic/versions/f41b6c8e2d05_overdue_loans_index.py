@@ -0,0 +1,30 @@
+"""overdue loans index
+
+Revision ID: f41b6c8e2d05
+Revises: e8d2f4a6b913
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f41b6c8e2d05'
+down_revision: Union[str, None] = 'e8d2f4a6b913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index('ix_book_loans_overdue', 'book_loans', ['id', 'estimated_return_date'], unique=False,
+                        postgresql_where=sa.text('actual_return_date IS NULL'), postgresql_concurrently=True,
+                        if_not_exists=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_book_loans_overdue', table_name='book_loans', postgresql_concurrently=True, if_exists=True)
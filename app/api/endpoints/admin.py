@@ -0,0 +1,28 @@
+from anyio import to_thread
+from fastapi import APIRouter, Depends
+from app.crud.names import author_ids, genre_ids
+from app.db.database import async_engine, async_pool_metrics, engine, pool_metrics
+from utils.security import RoleVerify, decoded_tokens, password_pool_stats, verified_users
+
+admin_router = APIRouter()
+
+
+@admin_router.get('/caches')
+def get_cache_stats(depends_on=Depends(RoleVerify(['admin']))):
+    return {
+        'author_ids': author_ids.cache.stats(),
+        'genre_ids': genre_ids.cache.stats(),
+        'verified_users': verified_users.stats(),
+        'decoded_tokens': decoded_tokens.stats(),
+    }
+
+
+@admin_router.get('/pool')
+async def get_pool_stats(depends_on=Depends(RoleVerify(['admin']))):
+    limiter = to_thread.current_default_thread_limiter()
+    return {
+        'sync': pool_metrics.snapshot(engine.pool),
+        'async': async_pool_metrics.snapshot(async_engine.pool),
+        'threads': {'limit': limiter.total_tokens, 'borrowed': limiter.borrowed_tokens},
+        'passwords': password_pool_stats(),
+    }
@@ -1,22 +1,30 @@
-from typing import Optional
+from typing import Optional, Union
 
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi_filter import FilterDepends
-from fastapi_pagination import Page, paginate
+from fastapi_pagination import Page, Params
+from fastapi_pagination.ext.sqlalchemy import paginate
 from fastapi_filter.contrib.sqlalchemy import Filter
-from sqlalchemy import select, or_
+from sqlalchemy import func, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.api import schemas
+from app.crud.names import author_ids
+from app.crud.versions import bump_versions
 from app.db import models
-from app.db.database import get_db
-from utils.security import RoleVerify
+from app.db.database import get_async_db, get_db
+from utils.etag import AsyncCatalogETag, CatalogETag
+from utils.pagination import paginate_keyset, paginate_keyset_async
+from utils.security import AsyncRoleVerify, RoleVerify
 
 authors_router = APIRouter()
+async_authors_router = APIRouter()
 
 
 class AuthorsFilter(Filter):
     name: Optional[str] = None
     biography: Optional[str] = None
+    search: Optional[str] = None
 
     def filter_query(self, query):
         conditions = []
@@ -26,17 +34,15 @@ class AuthorsFilter(Filter):
             conditions.append(models.Author.biography.ilike(f'%{self.biography}%'))
         if conditions:
             query = query.filter(or_(*conditions))
+        if self.search:
+            ts_query = func.websearch_to_tsquery(models.SEARCH_CONFIG, self.search)
+            query = query.filter(models.Author.search_vector.bool_op('@@')(ts_query))
+            query = query.order_by(func.ts_rank(models.Author.search_vector, ts_query).desc())
         return query
 
 
-@authors_router.get('', response_model=Page[schemas.AuthorGet])
-def get_authors(authors_filter: AuthorsFilter = FilterDepends(AuthorsFilter),
-                depends_on=Depends(RoleVerify(['admin', 'reader'])), db: Session = Depends(get_db)):
-    authors = db.execute(authors_filter.filter_query(select(models.Author))).scalars().all()
-    if not authors:
-        raise HTTPException(status_code=404, detail='Authors not found')
-
-    return paginate([
+def authors_out(authors: list[models.Author]) -> list[schemas.AuthorGet]:
+    return [
         schemas.AuthorGet(
             id=author.id,
             name=author.name,
@@ -44,7 +50,26 @@ def get_authors(authors_filter: AuthorsFilter = FilterDepends(AuthorsFilter),
             birth_date=author.birth_date
         )
         for author in authors
-    ])
+    ]
+
+
+@authors_router.get('', response_model=Union[Page[schemas.AuthorGet], schemas.CursorPage[schemas.AuthorGet]])
+def get_authors(authors_filter: AuthorsFilter = FilterDepends(AuthorsFilter), params: Params = Depends(),
+                cursor: Optional[str] = None, depends_on=Depends(RoleVerify(['admin', 'reader'])),
+                etag=Depends(CatalogETag('authors')), db: Session = Depends(get_db)):
+    query = authors_filter.filter_query(select(models.Author))
+    if cursor is not None:
+        if authors_filter.search:
+            raise HTTPException(status_code=400, detail='Cursor pagination is not supported for search')
+        page = paginate_keyset(db, query, models.Author.id, cursor, params.size, authors_out)
+        if not page.items and not cursor:
+            raise HTTPException(status_code=404, detail='Authors not found')
+        return page
+
+    page = paginate(db, query.order_by(models.Author.id), params, transformer=authors_out)
+    if not page.total:
+        raise HTTPException(status_code=404, detail='Authors not found')
+    return page
 
 
 @authors_router.post('', response_model=schemas.AuthorGet)
@@ -56,6 +81,8 @@ def create_author(author: schemas.AuthorPost, depends_on=Depends(RoleVerify(['ad
     )
     db.add(new_author)
     db.commit()
+    bump_versions(db, 'authors')
+    author_ids.invalidate(author.name)
     return schemas.AuthorGet(
         id=new_author.id,
         name=new_author.name,
@@ -71,6 +98,7 @@ def update_author(author_id: int, author: schemas.AuthorPost, depends_on=Depends
     if not existing_author:
         raise HTTPException(status_code=404, detail='Author not found')
 
+    old_name = existing_author.name
     fields_to_update = ["name", "biography", "birth_date"]
     for field in fields_to_update:
         value = getattr(author, field, None)
@@ -78,6 +106,8 @@ def update_author(author_id: int, author: schemas.AuthorPost, depends_on=Depends
             setattr(existing_author, field, value)
 
     db.commit()
+    bump_versions(db, 'authors')
+    author_ids.invalidate(old_name, author.name)
     return schemas.AuthorGet(
         id=existing_author.id,
         name=existing_author.name,
@@ -93,9 +123,30 @@ def delete_author(author_id: int, depends_on=Depends(RoleVerify(['admin'])), db:
         raise HTTPException(status_code=404, detail='Author not found')
     db.delete(existing_author)
     db.commit()
+    bump_versions(db, 'authors')
+    author_ids.invalidate(existing_author.name)
     return schemas.AuthorGet(
         id=existing_author.id,
         name=existing_author.name,
         biography=existing_author.biography,
         birth_date=existing_author.birth_date
     )
+
+
+@async_authors_router.get('', response_model=Union[Page[schemas.AuthorGet], schemas.CursorPage[schemas.AuthorGet]])
+async def get_authors_async(authors_filter: AuthorsFilter = FilterDepends(AuthorsFilter), params: Params = Depends(),
+                            cursor: Optional[str] = None, depends_on=Depends(AsyncRoleVerify(['admin', 'reader'])),
+                            etag=Depends(AsyncCatalogETag('authors')), db: AsyncSession = Depends(get_async_db)):
+    query = authors_filter.filter_query(select(models.Author))
+    if cursor is not None:
+        if authors_filter.search:
+            raise HTTPException(status_code=400, detail='Cursor pagination is not supported for search')
+        page = await paginate_keyset_async(db, query, models.Author.id, cursor, params.size, authors_out)
+        if not page.items and not cursor:
+            raise HTTPException(status_code=404, detail='Authors not found')
+        return page
+
+    page = await paginate(db, query.order_by(models.Author.id), params, transformer=authors_out)
+    if not page.total:
+        raise HTTPException(status_code=404, detail='Authors not found')
+    return page
@@ -1,22 +1,38 @@
-from typing import Optional
+import json
+import time
+from typing import AsyncIterator, Literal, Optional, Union
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from fastapi_filter import FilterDepends
 from fastapi_filter.contrib.sqlalchemy import Filter
-from fastapi_pagination import Page, paginate
-from sqlalchemy import or_, select
+from fastapi_pagination import Page, Params
+from fastapi_pagination.ext.sqlalchemy import paginate
+from sqlalchemy import delete, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.api import schemas
+from app.core.config import settings
+from app.crud.book import (books_out, get_book_out, ingest_books, iter_books_export, link_book, resolved_ids,
+                           select_books_out)
+from app.crud.names import author_ids, genre_ids
+from app.crud.versions import bump_versions
 from app.db import models
-from app.db.database import get_db
-from utils.security import RoleVerify
+from app.db.database import get_async_db, get_db
+from utils.etag import AsyncCatalogETag, CatalogETag
+from utils.notifications import Subscription, availability
+from utils.pagination import paginate_keyset, paginate_keyset_async
+from utils.security import AsyncRoleVerify, RoleVerify
 
 books_router = APIRouter()
+async_books_router = APIRouter()
 
 
 class BooksFilter(Filter):
     title: Optional[str] = None
     description: Optional[str] = None
+    search: Optional[str] = None
 
     def filter_query(self, query):
         conditions = []
@@ -26,58 +42,128 @@ class BooksFilter(Filter):
             conditions.append(models.Book.description.ilike(f'%{self.description}%'))
         if conditions:
             query = query.filter(or_(*conditions))
+        if self.search:
+            ts_query = func.websearch_to_tsquery(models.SEARCH_CONFIG, self.search)
+            query = query.filter(models.Book.search_vector.bool_op('@@')(ts_query))
+            query = query.order_by(func.ts_rank(models.Book.search_vector, ts_query).desc())
         return query
 
 
-@books_router.get('', response_model=Page[schemas.BookOut])
-def get_books(books_filter: BooksFilter = FilterDepends(BooksFilter),
-              depends_on=Depends(RoleVerify(['admin', 'reader'])), db: Session = Depends(get_db)):
-    books = db.execute(books_filter.filter_query(select(models.Book))).scalars().all()
-    if not books:
+@books_router.get('', response_model=Union[Page[schemas.BookOut], schemas.CursorPage[schemas.BookOut]])
+def get_books(books_filter: BooksFilter = FilterDepends(BooksFilter), params: Params = Depends(),
+              cursor: Optional[str] = None, depends_on=Depends(RoleVerify(['admin', 'reader'])),
+              etag=Depends(CatalogETag('books', 'authors', 'genres')), db: Session = Depends(get_db)):
+    query = books_filter.filter_query(select_books_out())
+    if cursor is not None:
+        if books_filter.search:
+            raise HTTPException(status_code=400, detail='Cursor pagination is not supported for search')
+        page = paginate_keyset(db, query, models.Book.id, cursor, params.size, books_out)
+        if not page.items and not cursor:
+            raise HTTPException(status_code=404, detail='Books not found')
+        return page
+
+    page = paginate(db, query.order_by(models.Book.id), params, transformer=books_out, unique=False)
+    if not page.total:
         raise HTTPException(status_code=404, detail='Books not found')
+    return page
 
-    return paginate([
-        schemas.BookOut(
-            id=book.id,
-            title=book.title,
-            description=book.description,
-            publication_date=book.publication_date,
-            available_copies=book.available_copies,
-            genres=[genre.name for genre in book.genres],
-            authors=[author.name for author in book.authors]
-        )
-        for book in books
-    ])
+
+@books_router.get('/export')
+def export_books(export_format: Literal['ndjson', 'csv'] = Query('ndjson', alias='format'),
+                 depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
+    media_type = 'text/csv' if export_format == 'csv' else 'application/x-ndjson'
+    return StreamingResponse(
+        iter_books_export(db.get_bind(), export_format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="books.{export_format}"'},
+    )
 
 
 @books_router.post('', response_model=schemas.BookOut)
 def create_book(book: schemas.BookCreate, depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
-    authors = db.query(models.Author).filter(models.Author.name.in_(book.authors)).all()
-    genres = db.query(models.Genre).filter(models.Genre.name.in_(book.genres)).all()
-
-    if len(authors) != len(book.authors):
-        raise HTTPException(status_code=400, detail="Some authors do not exist")
-    if len(genres) != len(book.genres):
-        raise HTTPException(status_code=400, detail="Some genres do not exist")
+    authors = resolved_ids(author_ids.resolve(db, book.authors), book.authors, 'authors')
+    genres = resolved_ids(genre_ids.resolve(db, book.genres), book.genres, 'genres')
     new_book = models.Book(
         title=book.title,
         description=book.description,
         publication_date=book.publication_date,
         available_copies=book.available_copies,
-        authors=authors,
-        genres=genres
     )
     db.add(new_book)
+    db.flush()
+    book_id = new_book.id
+    link_book(db, book_id, authors, genres)
     db.commit()
-    return schemas.BookOut(
-        id=new_book.id,
-        title=new_book.title,
-        description=new_book.description,
-        publication_date=new_book.publication_date,
-        available_copies=new_book.available_copies,
-        genres=[genre.name for genre in new_book.genres],
-        authors=[author.name for author in new_book.authors]
-    )
+    bump_versions(db, 'books')
+    return get_book_out(db, book_id)
+
+
+async def _ndjson_lines(request: Request) -> AsyncIterator[tuple[int, bytes]]:
+    line_no = 0
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            line_no += 1
+            if line.strip():
+                yield line_no, line
+    # строки декодируются в ingest_books, чтобы невалидный UTF-8 попал в отчет своей строкой
+    if buffer.strip():
+        yield line_no + 1, buffer
+
+
+@books_router.post('/bulk', response_model=schemas.BulkIngestReport)
+async def bulk_create_books(request: Request, chunk_size: int = Query(settings.BULK_INGEST_CHUNK_SIZE, ge=1),
+                            depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
+    report = schemas.BulkIngestReport()
+    chunk = []
+    async for line in _ndjson_lines(request):
+        chunk.append(line)
+        if len(chunk) >= chunk_size:
+            await run_in_threadpool(ingest_books, db, chunk, report)
+            chunk = []
+    if chunk:
+        await run_in_threadpool(ingest_books, db, chunk, report)
+    return report
+
+
+def _availability_event(book_id: int, available_copies: int) -> str:
+    return f"event: availability\ndata: {json.dumps({'book_id': book_id, 'available_copies': available_copies})}\n\n"
+
+
+async def _availability_stream(subscription: Subscription, snapshot: dict[int, int]) -> AsyncIterator[str]:
+    try:
+        for book_id, available_copies in snapshot.items():
+            yield _availability_event(book_id, available_copies)
+        # поток закрывается через AVAILABILITY_STREAM_TTL, EventSource переподключается сам
+        deadline = time.monotonic() + settings.AVAILABILITY_STREAM_TTL
+        while (remaining := deadline - time.monotonic()) > 0:
+            changes = await subscription.changes(min(settings.AVAILABILITY_KEEPALIVE, remaining))
+            if not changes:
+                yield ': keepalive\n\n'
+            for book_id, available_copies in changes.items():
+                yield _availability_event(book_id, available_copies)
+    finally:
+        availability.unsubscribe(subscription)
+
+
+@books_router.get('/availability')
+async def watch_availability(book_ids: list[int] = Query(alias='id', min_length=1, max_length=100),
+                             depends_on=Depends(AsyncRoleVerify(['admin', 'reader'])),
+                             db: AsyncSession = Depends(get_async_db)):
+    # подписка оформляется до чтения остатков, чтобы не потерять изменения между ними
+    subscription = availability.subscribe(book_ids)
+    try:
+        rows = await db.execute(
+            select(models.Book.id, models.Book.available_copies).where(models.Book.id.in_(book_ids))
+        )
+    except Exception:
+        availability.unsubscribe(subscription)
+        raise
+    snapshot = {row.id: row.available_copies for row in rows}
+    return StreamingResponse(_availability_stream(subscription, snapshot), media_type='text/event-stream',
+                             headers={'Cache-Control': 'no-cache'})
 
 
 @books_router.put('/{book_id}', response_model=schemas.BookOut)
@@ -92,42 +178,50 @@ def update_book(book_id: int, book: schemas.BookUpdate, depends_on=Depends(RoleV
         value = getattr(book, field, None)
         if value is not None:
             setattr(existing_book, field, value)
+    genres = None
     if book.genres:
-        genres = db.query(models.Genre).filter(models.Genre.name.in_(book.genres)).all()
-        if len(genres) != len(book.genres):
-            raise HTTPException(status_code=400, detail="Some genres do not exist")
-        existing_book.genres = genres
+        genres = resolved_ids(genre_ids.resolve(db, book.genres), book.genres, 'genres')
+    authors = None
     if book.authors:
-        authors = db.query(models.Author).filter(models.Author.name.in_(book.authors)).all()
-        if len(authors) != len(book.authors):
-            raise HTTPException(status_code=400, detail="Some authors do not exist")
-        existing_book.authors = authors
+        authors = resolved_ids(author_ids.resolve(db, book.authors), book.authors, 'authors')
+    link_book(db, book_id, authors, genres, replace=True)
+    available_copies = existing_book.available_copies
 
     db.commit()
-    return schemas.BookOut(
-        id=existing_book.id,
-        title=existing_book.title,
-        description=existing_book.description,
-        publication_date=existing_book.publication_date,
-        available_copies=existing_book.available_copies,
-        genres=[genre.name for genre in existing_book.genres],
-        authors=[author.name for author in existing_book.authors]
-    )
+    bump_versions(db, 'books')
+    if book.available_copies is not None:
+        availability.publish({book_id: available_copies})
+    return get_book_out(db, book_id)
 
 
 @books_router.delete('/{book_id}', response_model=schemas.BookOut)
 def delete_book(book_id: int, depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
-    existing_book = db.query(models.Book).filter(models.Book.id == book_id).first()
+    existing_book = get_book_out(db, book_id)
     if not existing_book:
         raise HTTPException(status_code=404, detail='Book not found')
-    db.delete(existing_book)
+    db.execute(delete(models.books_genres).where(models.books_genres.c.book_id == book_id))
+    db.execute(delete(models.books_authors).where(models.books_authors.c.book_id == book_id))
+    db.execute(delete(models.Book).where(models.Book.id == book_id))
     db.commit()
-    return schemas.BookOut(
-        id=existing_book.id,
-        title=existing_book.title,
-        description=existing_book.description,
-        publication_date=existing_book.publication_date,
-        available_copies=existing_book.available_copies,
-        genres=[genre.name for genre in existing_book.genres],
-        authors=[author.name for author in existing_book.authors]
-    )
+    bump_versions(db, 'books')
+    return existing_book
+
+
+@async_books_router.get('', response_model=Union[Page[schemas.BookOut], schemas.CursorPage[schemas.BookOut]])
+async def get_books_async(books_filter: BooksFilter = FilterDepends(BooksFilter), params: Params = Depends(),
+                          cursor: Optional[str] = None, depends_on=Depends(AsyncRoleVerify(['admin', 'reader'])),
+                          etag=Depends(AsyncCatalogETag('books', 'authors', 'genres')),
+                          db: AsyncSession = Depends(get_async_db)):
+    query = books_filter.filter_query(select_books_out())
+    if cursor is not None:
+        if books_filter.search:
+            raise HTTPException(status_code=400, detail='Cursor pagination is not supported for search')
+        page = await paginate_keyset_async(db, query, models.Book.id, cursor, params.size, books_out)
+        if not page.items and not cursor:
+            raise HTTPException(status_code=404, detail='Books not found')
+        return page
+
+    page = await paginate(db, query.order_by(models.Book.id), params, transformer=books_out, unique=False)
+    if not page.total:
+        raise HTTPException(status_code=404, detail='Books not found')
+    return page
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
-from datetime import date, timedelta
 from app.db.database import get_db
+from app.crud.loan import (MAX_ACTIVE_LOANS, borrow_books, close_loan, count_active_loans, delete_loan, insert_loan,
+                           loan_out, loans_out, overdue_loans_out, release_copy, return_loans, select_overdue_loans,
+                           select_user_loans, take_copy)
+from app.crud.versions import bump_versions
 from app.db import models
 from app.api import schemas
 from logging_config import logger
+from utils.pagination import paginate_keyset
+from utils.notifications import availability
 from utils.security import RoleVerify
 
 loan_router = APIRouter()
@@ -12,122 +18,117 @@ loan_router = APIRouter()
 
 @loan_router.post('/borrow/{book_id}', response_model=schemas.BookLoanOut)
 def borrow_book(book_id: int, db: Session = Depends(get_db),
-                current_user: dict = Depends(RoleVerify(['reader', 'admin']))):
-    username = current_user.get('sub')
-    user_id = db.query(models.User).filter(models.User.username == username).first().id
-    user_loans = db.query(models.BookLoan).filter(models.BookLoan.user_id == user_id).all()
-    if len(user_loans) >= 5:
+                current_user: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
+    username, user_id = current_user.username, current_user.id
+    if count_active_loans(db, user_id) >= MAX_ACTIVE_LOANS:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
-                            detail="You can't borrow more than 5 books at the same time.")
+                            detail=f"You can't borrow more than {MAX_ACTIVE_LOANS} books at the same time.")
 
-    book = db.query(models.Book).filter(models.Book.id == book_id).first()
+    book = take_copy(db, book_id)
     if not book:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found.")
-    if book.available_copies <= 0:
+        db.rollback()
+        if not db.get(models.Book, book_id):
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Book not found.")
         raise HTTPException(status.HTTP_400_BAD_REQUEST, detail="No available copies of the book.")
 
-    estimated_return_date = date.today() + timedelta(days=14)
-
-    new_loan = models.BookLoan(
-        user_id=user_id,
-        book_id=book.id,
-        issue_date=date.today(),
-        estimated_return_date=estimated_return_date,
-        actual_return_date=None,
-    )
-
-    db.add(new_loan)
-    db.commit()
-
-    book.available_copies -= 1
+    new_loan = insert_loan(db, user_id, book.id)
     db.commit()
-    logger.info(f"User {username} borrowed book '{book.title}' (ID: {book.id})")
-    return schemas.BookLoanOut(
-        loan_id=new_loan.id,
-        user_id=user_id,
-        book_id=book.id,
-        issue_date=new_loan.issue_date,
-        estimated_return_date=new_loan.estimated_return_date,
-        actual_return_date=None,
-    )
+    bump_versions(db, 'books')
+    availability.publish({book.id: book.available_copies})
+    logger.info("User %s borrowed book '%s' (ID: %s)", username, book.title, book.id,
+                extra={'event': 'borrow', 'user_id': user_id, 'book_id': book.id, 'loan_id': new_loan.id})
+    return loan_out(new_loan)
 
 
 @loan_router.post('/return/{loan_id}', response_model=schemas.BookLoanOut)
 def return_book(loan_id: int, db: Session = Depends(get_db),
-                current_user: dict = Depends(RoleVerify(['reader', 'admin']))):
-    username = current_user.get('sub')
-    user_id = db.query(models.User).filter(models.User.username == username).first().id
-    loan = db.query(models.BookLoan).filter(models.BookLoan.id == loan_id, models.BookLoan.user_id == user_id).first()
+                current_user: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
+    username, user_id = current_user.username, current_user.id
+    loan = close_loan(db, loan_id, user_id)
 
     if not loan:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail="Loan not found or this loan does not belong to you.")
-    if loan.actual_return_date:
+        db.rollback()
+        returned = db.query(models.BookLoan.id).filter(models.BookLoan.id == loan_id,
+                                                       models.BookLoan.user_id == user_id).first()
+        if not returned:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail="Loan not found or this loan does not belong to you.")
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='You already returned this book')
-    loan.actual_return_date = date.today()
-    db.commit()
 
-    book = db.query(models.Book).filter(models.Book.id == loan.book_id).first()
+    book = release_copy(db, loan.book_id)
     if not book:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Book not found.")
 
-    book.available_copies += 1
     db.commit()
-    logger.info(f"User {username} returned book '{book.title}' (ID: {book.id})")
-    return schemas.BookLoanOut(
-        loan_id=loan.id,
-        user_id=loan.user_id,
-        book_id=loan.book_id,
-        issue_date=loan.issue_date,
-        estimated_return_date=loan.estimated_return_date,
-        actual_return_date=loan.actual_return_date,
-    )
-
-
-@loan_router.get('/my', response_model=list[schemas.BookLoanOut])
-def get_my_loans(db: Session = Depends(get_db), current_user: dict = Depends(RoleVerify(['reader', 'admin']))):
-    user_id = db.query(models.User).filter(models.User.username == current_user.get('sub')).first().id
-    loans = db.query(models.BookLoan).filter(models.BookLoan.user_id == user_id).all()
-
-    if not loans:
-        raise HTTPException(status_code=404, detail="You have no borrowed books.")
-
-    return [
-        schemas.BookLoanOut(
-            loan_id=loan.id,
-            user_id=loan.user_id,
-            book_id=loan.book_id,
-            issue_date=loan.issue_date,
-            estimated_return_date=loan.estimated_return_date,
-            actual_return_date=loan.actual_return_date
-        )
-        for loan in loans
-    ]
+    bump_versions(db, 'books')
+    availability.publish({book.id: book.available_copies})
+    logger.info("User %s returned book '%s' (ID: %s)", username, book.title, book.id,
+                extra={'event': 'return', 'user_id': user_id, 'book_id': book.id, 'loan_id': loan.id})
+    return loan_out(loan)
+
+
+@loan_router.post('/borrow', response_model=list[schemas.LoanBatchItem])
+def borrow_book_batch(batch: schemas.BorrowBatch, db: Session = Depends(get_db),
+                      current_user: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
+    results, books = borrow_books(db, current_user.id, batch.book_ids)
+    db.commit()
+    if books:
+        bump_versions(db, 'books')
+        availability.publish({book.id: book.available_copies for book in books})
+    for book in books:
+        logger.info("User %s borrowed book '%s' (ID: %s)", current_user.username, book.title, book.id,
+                    extra={'event': 'borrow', 'user_id': current_user.id, 'book_id': book.id})
+    return results
+
+
+@loan_router.post('/return', response_model=list[schemas.LoanBatchItem])
+def return_book_batch(batch: schemas.ReturnBatch, db: Session = Depends(get_db),
+                      current_user: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
+    results, books = return_loans(db, current_user.id, batch.loan_ids)
+    db.commit()
+    if books:
+        bump_versions(db, 'books')
+        availability.publish({book.id: book.available_copies for book in books})
+    for book in books:
+        logger.info("User %s returned book '%s' (ID: %s)", current_user.username, book.title, book.id,
+                    extra={'event': 'return', 'user_id': current_user.id, 'book_id': book.id})
+    return results
+
+
+@loan_router.get('/my', response_model=schemas.CursorPage[schemas.BookLoanOut])
+def get_my_loans(loan_status: Optional[Literal['active', 'returned']] = Query(None, alias='status'),
+                 cursor: Optional[str] = None, size: int = Query(50, ge=1, le=100), db: Session = Depends(get_db),
+                 current_user: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
+    query = select_user_loans(current_user.id, loan_status)
+    return paginate_keyset(db, query, models.BookLoan.id, cursor, size, loans_out)
 
 
 @loan_router.delete('/remove/{loan_id}', response_model=schemas.BookLoanOut)
 def remove_loan(loan_id: int, db: Session = Depends(get_db),
                 depdends_on: dict = Depends(RoleVerify(['admin']))):
-    loan = db.query(models.BookLoan).filter(models.BookLoan.id == loan_id).first()
+    loan = delete_loan(db, loan_id)
 
     if not loan:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Loan not found.")
 
-    book = db.query(models.Book).filter(models.Book.id == loan.book_id).first()
-    if not book:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Book not found.")
+    book = None
+    # возвращенная книга уже учтена в available_copies
+    if loan.actual_return_date is None:
+        book = release_copy(db, loan.book_id)
+        if not book:
+            db.rollback()
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Book not found.")
 
-    db.delete(loan)
     db.commit()
+    bump_versions(db, 'books')
+    if book:
+        availability.publish({book.id: book.available_copies})
+    return loan_out(loan)
 
-    book.available_copies += 1
-    db.commit()
 
-    return schemas.BookLoanOut(
-        loan_id=loan.id,
-        user_id=loan.user_id,
-        book_id=loan.book_id,
-        issue_date=loan.issue_date,
-        estimated_return_date=loan.estimated_return_date,
-        actual_return_date=loan.actual_return_date,
-    )
+@loan_router.get('/overdue', response_model=schemas.CursorPage[schemas.OverdueLoanOut])
+def get_overdue_loans(cursor: Optional[str] = None, size: int = Query(50, ge=1, le=100),
+                      depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
+    return paginate_keyset(db, select_overdue_loans(), models.BookLoan.id, cursor, size, overdue_loans_out)
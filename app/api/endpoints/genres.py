@@ -1,15 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.api import schemas
+from app.crud.names import genre_ids
+from app.crud.versions import bump_versions
 from app.db import models
-from app.db.database import get_db
-from utils.security import RoleVerify
+from app.db.database import get_async_db, get_db
+from utils.etag import AsyncCatalogETag, CatalogETag
+from utils.security import AsyncRoleVerify, RoleVerify
 
 genres_router = APIRouter()
+async_genres_router = APIRouter()
 
 
 @genres_router.get('', response_model=list[schemas.GenreGet])
-def get_genres(depends_on=Depends(RoleVerify(['admin'])), db: Session = Depends(get_db)):
+def get_genres(depends_on=Depends(RoleVerify(['admin'])), etag=Depends(CatalogETag('genres')),
+               db: Session = Depends(get_db)):
     genres = db.query(models.Genre).all()
     if not genres:
         raise HTTPException(status_code=404, detail='Books not found')
@@ -33,6 +40,8 @@ def create_genre(genre: schemas.GenrePost, depends_on=Depends(RoleVerify(['admin
 
     db.add(new_genre)
     db.commit()
+    bump_versions(db, 'genres')
+    genre_ids.invalidate(genre.name)
     return schemas.GenreGet(id=new_genre.id, name=new_genre.name)
 
 
@@ -43,9 +52,12 @@ def update_genre(genre_id: int, genre: schemas.GenrePost, depends_on=Depends(Rol
     if not existing_genre:
         raise HTTPException(status_code=404, detail='Genre not found')
 
+    old_name = existing_genre.name
     existing_genre.name = genre.name
 
     db.commit()
+    bump_versions(db, 'genres')
+    genre_ids.invalidate(old_name, genre.name)
     return schemas.GenreGet(
         name=existing_genre.name,
         id=existing_genre.id
@@ -59,7 +71,25 @@ def delete_genre(genre_id: int, depends_on=Depends(RoleVerify(['admin'])), db: S
         raise HTTPException(status_code=404, detail='Genre not found')
     db.delete(existing_genre)
     db.commit()
+    bump_versions(db, 'genres')
+    genre_ids.invalidate(existing_genre.name)
     return schemas.GenreGet(
         name=existing_genre.name,
         id=existing_genre.id
     )
+
+
+@async_genres_router.get('', response_model=list[schemas.GenreGet])
+async def get_genres_async(depends_on=Depends(AsyncRoleVerify(['admin'])), etag=Depends(AsyncCatalogETag('genres')),
+                           db: AsyncSession = Depends(get_async_db)):
+    genres = (await db.execute(select(models.Genre))).scalars().all()
+    if not genres:
+        raise HTTPException(status_code=404, detail='Books not found')
+
+    return [
+        schemas.GenreGet(
+            id=genre.id,
+            name=genre.name
+        )
+        for genre in genres
+    ]
@@ -0,0 +1,14 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from app.core.config import settings
+from utils.metrics import request_metrics
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get('/metrics', response_class=PlainTextResponse)
+async def get_metrics(authorization: Optional[str] = Header(None)):
+    if settings.METRICS_TOKEN and authorization != f'Bearer {settings.METRICS_TOKEN}':
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid metrics token')
+    return PlainTextResponse(request_metrics.render(), media_type='text/plain; version=0.0.4')
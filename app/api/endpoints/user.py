@@ -1,43 +1,61 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from fastapi.responses import JSONResponse
 from app.crud.user import create_user
 from app.api import schemas
 from app.db import models
 from app.db.database import get_db
-from utils.security import verify_password, create_access_token, RoleVerify
+from utils.security import create_access_token, hash_password_async, verify_password_async, RoleVerify
 
 auth_router = APIRouter()
 
 
 @auth_router.post('/register', response_model=schemas.UserCreate)
-def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = create_user(db=db, user=user)
+async def register_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    hashed_password = await hash_password_async(user.password)
+    db_user = await run_in_threadpool(create_user, db=db, user=user, hashed_password=hashed_password)
     if not db_user:
         raise HTTPException(status_code=400, detail="Username or email already taken")
     return JSONResponse(content={'details': 'Successfully registered!'})
 
 
+def _find_user(db: Session, username: str):
+    return db.query(models.User).filter(models.User.username == username).first()
+
+
+def _rehash_password(db: Session, db_user: models.User, hashed_password: str):
+    db_user.hashed_password = hashed_password
+    db.commit()
+
+
 @auth_router.post('/login')
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+async def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(_find_user, db, user.username)
     try:
-        db_user = db.query(models.User).filter(models.User.username == user.username).first()
-        if not verify_password(user.password, db_user.hashed_password):
+        valid, new_hash = await verify_password_async(user.password, db_user.hashed_password)
+        if not valid:
             raise HTTPException(status_code=401, detail='Invalid username or password')
     except Exception:
         raise HTTPException(status_code=401, detail='Invalid username or password')
-    access_token = create_access_token(data={'sub': db_user.username, 'role': db_user.role.value})
+    access_token = create_access_token(data={'sub': db_user.username, 'uid': db_user.id,
+                                             'role': db_user.role.value})
+    if new_hash:
+        await run_in_threadpool(_rehash_password, db, db_user, new_hash)
     return {'access_token': access_token, 'token_type': 'bearer'}
 
 
 @auth_router.put('/me', response_model=schemas.UserUpdate)
 def change_user_info(user: schemas.UserUpdate, db: Session = Depends(get_db),
-                     payload: dict = Depends(RoleVerify(['reader', 'admin']))):
-    username = payload.get('sub')
+                     principal: schemas.Principal = Depends(RoleVerify(['reader', 'admin']))):
     users = db.query(models.User).filter(models.User.email == user.email).first()
     if users:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Such email already exists')
-    current_user = db.query(models.User).filter(models.User.username == username).first()
+    current_user = db.get(models.User, principal.id)
+    if current_user is None:
+        # пользователь мог быть удален после проверки токена, которую кэширует RoleVerify
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail=f'User {principal.username} does not exist')
     current_user.email = user.email
     db.commit()
     return schemas.UserUpdate(email=current_user.email)
@@ -1,7 +1,9 @@
 from datetime import date
-from typing import Optional
+from typing import Generic, Optional, TypeVar
 from fastapi import HTTPException, status
-from pydantic import BaseModel, EmailStr, field_validator
+from pydantic import BaseModel, EmailStr, Field, field_validator
+
+T = TypeVar('T')
 
 
 class UserCreate(BaseModel):
@@ -19,13 +21,20 @@ class UserUpdate(BaseModel):
     email: EmailStr
 
 
+class Principal(BaseModel):
+    id: int
+    username: str
+    role: str
+
+
 class BookBase(BaseModel):
-    title: str
+    title: str = Field(max_length=255)
     description: Optional[str] = None
     publication_date: Optional[date] = None
     available_copies: int
 
-    @field_validator('available_copies', mode='before')
+    # проверка после приведения типа: строки и null отклоняет сам pydantic, а не сравнение с нулем
+    @field_validator('available_copies')
     @classmethod
     def validate_available_copies(cls, value: int) -> int:
         if value < 0:
@@ -45,6 +54,17 @@ class BookOut(BookBase):
     authors: list[str]
 
 
+class BulkIngestError(BaseModel):
+    line: int
+    detail: str
+
+
+class BulkIngestReport(BaseModel):
+    created: int = 0
+    failed: int = 0
+    errors: list[BulkIngestError] = []
+
+
 class BookUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
@@ -71,6 +91,26 @@ class BookLoanOut(BaseModel):
     actual_return_date: Optional[date]
 
 
+class BorrowBatch(BaseModel):
+    book_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class ReturnBatch(BaseModel):
+    loan_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class LoanBatchItem(BaseModel):
+    id: int
+    status_code: int
+    detail: Optional[str] = None
+    loan: Optional[BookLoanOut] = None
+
+
+class OverdueLoanOut(BookLoanOut):
+    username: str
+    book_title: str
+
+
 class AuthorPost(BaseModel):
     name: str
     biography: Optional[str] = None
@@ -79,3 +119,9 @@ class AuthorPost(BaseModel):
 
 class AuthorGet(AuthorPost):
     id: int
+
+
+class CursorPage(BaseModel, Generic[T]):
+    items: list[T]
+    size: int
+    next_cursor: Optional[str] = None
@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +13,30 @@ class Settings(BaseSettings):
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     DB_TEST_NAME: str
+    BULK_INGEST_CHUNK_SIZE: int = 1000
+    NAME_CACHE_SIZE: int = 10000
+    NAME_CACHE_TTL: float = 60
+    DB_ASYNC: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: float = 60
+    TOKEN_CACHE_SIZE: int = 10000
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    AVAILABILITY_KEEPALIVE: float = 15
+    AVAILABILITY_STREAM_TTL: float = 300
+    LOG_LEVEL: str = 'INFO'
+    LOG_FILE: str = 'book_loans.log'
+    LOG_MAX_BYTES: int = 10 * 1024 * 1024
+    LOG_ROTATE_INTERVAL: float = 24 * 60 * 60
+    LOG_BACKUP_COUNT: int = 7
+    METRICS_TOKEN: Optional[str] = None
+    DEBUG: bool = False
+    REPEATED_QUERY_THRESHOLD: int = 5
 
     @property
     def DATABASE_URL(self):
@@ -21,6 +46,24 @@ class Settings(BaseSettings):
     def TEST_DATABASE_URL(self):
         return f'postgresql://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_TEST_NAME}'
 
+    @property
+    def POOL_OPTIONS(self):
+        return {
+            'pool_size': self.DB_POOL_SIZE,
+            'max_overflow': self.DB_MAX_OVERFLOW,
+            'pool_timeout': self.DB_POOL_TIMEOUT,
+            'pool_recycle': self.DB_POOL_RECYCLE,
+            'pool_pre_ping': self.DB_POOL_PRE_PING,
+        }
+
+    @property
+    def ASYNC_DATABASE_URL(self):
+        return self.DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
+    @property
+    def TEST_ASYNC_DATABASE_URL(self):
+        return self.TEST_DATABASE_URL.replace('postgresql://', 'postgresql+asyncpg://', 1)
+
     model_config = SettingsConfigDict(
         env_file=os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '.env')))
 
@@ -0,0 +1,164 @@
+import csv
+import io
+import json
+from typing import Iterable, Iterator, Optional
+
+from fastapi import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import ARRAY, Engine, Select, String, Table, delete, func, insert, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session
+from app.api import schemas
+from app.crud.names import author_ids, genre_ids
+from app.crud.versions import bump_versions
+from app.db import models
+
+
+def _names(model, association: Table):
+    names = (
+        select(model.name)
+        .join(association)
+        .where(association.c.book_id == models.Book.id)
+        .order_by(model.name)
+        .scalar_subquery()
+    )
+    return func.array(names, type_=ARRAY(String))
+
+
+def select_books_out() -> Select:
+    return select(
+        models.Book.id,
+        models.Book.title,
+        models.Book.description,
+        models.Book.publication_date,
+        models.Book.available_copies,
+        _names(models.Genre, models.books_genres).label('genres'),
+        _names(models.Author, models.books_authors).label('authors'),
+    )
+
+
+def books_out(rows) -> list[schemas.BookOut]:
+    return [schemas.BookOut(**row._mapping) for row in rows]
+
+
+def get_book_out(db: Session, book_id: int) -> Optional[schemas.BookOut]:
+    row = db.execute(select_books_out().where(models.Book.id == book_id)).first()
+    return schemas.BookOut(**row._mapping) if row else None
+
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FIELDS = list(schemas.BookOut.model_fields)
+
+
+def _ndjson_chunk(books: list[schemas.BookOut]) -> str:
+    return ''.join(book.model_dump_json() + '\n' for book in books)
+
+
+def _csv_chunk(books: list[schemas.BookOut], header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_FIELDS)
+    for book in books:
+        row = book.model_dump()
+        row['genres'] = ';'.join(book.genres)
+        row['authors'] = ';'.join(book.authors)
+        writer.writerow(row[field] for field in EXPORT_FIELDS)
+    return buffer.getvalue()
+
+
+def iter_books_export(bind: Engine, export_format: str) -> Iterator[str]:
+    with Session(bind) as db:
+        if export_format == 'csv':
+            yield _csv_chunk([], header=True)
+        query = select_books_out().order_by(models.Book.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        for rows in db.execute(query).partitions():
+            books = books_out(rows)
+            yield _csv_chunk(books) if export_format == 'csv' else _ndjson_chunk(books)
+
+
+def resolved_ids(resolved: dict[str, list[int]], names: Iterable[str], label: str) -> list[int]:
+    names = set(names)
+    if not names <= resolved.keys():
+        raise HTTPException(status_code=400, detail=f'Some {label} do not exist')
+    # имена авторов не уникальны: одноименных авторов не угадываем, а отклоняем запрос, как и до кэша
+    if any(len(resolved[name]) > 1 for name in names):
+        raise HTTPException(status_code=400, detail=f'Some {label} are ambiguous')
+    return sorted(resolved[name][0] for name in names)
+
+
+def link_book(db: Session, book_id: int, authors: Optional[list[int]] = None, genres: Optional[list[int]] = None,
+              replace: bool = False) -> None:
+    links = ((models.books_authors, 'author_id', authors), (models.books_genres, 'genre_id', genres))
+    for table, column, ids in links:
+        if ids is None:
+            continue
+        if replace:
+            db.execute(delete(table).where(table.c.book_id == book_id))
+        if ids:
+            db.execute(insert(table), [{'book_id': book_id, column: model_id} for model_id in ids])
+
+
+def _insert_books(db: Session, books: list[tuple[schemas.BookCreate, list[int], list[int]]]) -> None:
+    book_ids = db.execute(
+        insert(models.Book).returning(models.Book.id, sort_by_parameter_order=True),
+        [book.model_dump(include={'title', 'description', 'publication_date', 'available_copies'})
+         for book, _, _ in books],
+    ).scalars().all()
+    books_authors = [
+        {'book_id': book_id, 'author_id': author_id}
+        for book_id, (_, authors, _) in zip(book_ids, books) for author_id in authors
+    ]
+    books_genres = [
+        {'book_id': book_id, 'genre_id': genre_id}
+        for book_id, (_, _, genres) in zip(book_ids, books) for genre_id in genres
+    ]
+    if books_authors:
+        db.execute(insert(models.books_authors), books_authors)
+    if books_genres:
+        db.execute(insert(models.books_genres), books_genres)
+
+
+def ingest_books(db: Session, lines: list[tuple[int, bytes]], report: schemas.BulkIngestReport) -> None:
+    books = []
+    for line_no, line in lines:
+        try:
+            books.append((line_no, schemas.BookCreate.model_validate(json.loads(line.decode()))))
+        except HTTPException as e:
+            report.errors.append(schemas.BulkIngestError(line=line_no, detail=e.detail))
+        except (ValueError, TypeError, ValidationError) as e:
+            report.errors.append(schemas.BulkIngestError(line=line_no, detail=str(e)))
+
+    authors = author_ids.resolve(db, {name for _, book in books for name in book.authors})
+    genres = genre_ids.resolve(db, {name for _, book in books for name in book.genres})
+
+    resolved = []
+    for line_no, book in books:
+        try:
+            resolved.append((line_no, (book, resolved_ids(authors, book.authors, 'authors'),
+                                       resolved_ids(genres, book.genres, 'genres'))))
+        except HTTPException as e:
+            report.errors.append(schemas.BulkIngestError(line=line_no, detail=e.detail))
+
+    created = 0
+    if resolved:
+        try:
+            _insert_books(db, [book for _, book in resolved])
+            db.commit()
+            created = len(resolved)
+        except DBAPIError:
+            db.rollback()
+            # пачка откатилась целиком: строки повторяются по одной в savepoint, чтобы отчет назвал только виноватые
+            for line_no, book in resolved:
+                try:
+                    with db.begin_nested():
+                        _insert_books(db, [book])
+                    created += 1
+                except DBAPIError as e:
+                    report.errors.append(schemas.BulkIngestError(line=line_no, detail=str(e.orig).strip()))
+            db.commit()
+        if created:
+            bump_versions(db, 'books')
+
+    report.created += created
+    report.failed = len(report.errors)
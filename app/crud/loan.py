@@ -0,0 +1,208 @@
+from datetime import date, timedelta
+from collections import Counter
+from typing import Literal, Optional
+from sqlalchemy import Row, Select, case, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from starlette import status
+from app.api import schemas
+from app.db import models
+
+LOAN_PERIOD = timedelta(days=14)
+MAX_ACTIVE_LOANS = 5
+LOAN_COLUMNS = (
+    models.BookLoan.id,
+    models.BookLoan.user_id,
+    models.BookLoan.book_id,
+    models.BookLoan.issue_date,
+    models.BookLoan.estimated_return_date,
+    models.BookLoan.actual_return_date,
+)
+
+
+def loan_out(loan) -> schemas.BookLoanOut:
+    return schemas.BookLoanOut(
+        loan_id=loan.id,
+        user_id=loan.user_id,
+        book_id=loan.book_id,
+        issue_date=loan.issue_date,
+        estimated_return_date=loan.estimated_return_date,
+        actual_return_date=loan.actual_return_date,
+    )
+
+
+def loans_out(rows) -> list[schemas.BookLoanOut]:
+    return [loan_out(row) for row in rows]
+
+
+def select_user_loans(user_id: int, loan_status: Optional[Literal['active', 'returned']] = None) -> Select:
+    query = select(*LOAN_COLUMNS).where(models.BookLoan.user_id == user_id)
+    if loan_status == 'active':
+        query = query.where(models.BookLoan.actual_return_date.is_(None))
+    elif loan_status == 'returned':
+        query = query.where(models.BookLoan.actual_return_date.is_not(None))
+    return query
+
+
+def select_overdue_loans() -> Select:
+    return (
+        select(*LOAN_COLUMNS, models.User.username, models.Book.title.label('book_title'))
+        .join(models.BookLoan.user)
+        .join(models.BookLoan.book)
+        .where(models.BookLoan.actual_return_date.is_(None), models.BookLoan.estimated_return_date < date.today())
+    )
+
+
+def overdue_loans_out(rows) -> list[schemas.OverdueLoanOut]:
+    return [
+        schemas.OverdueLoanOut(**loan_out(row).model_dump(), username=row.username, book_title=row.book_title)
+        for row in rows
+    ]
+
+
+def count_active_loans(db: Session, user_id: int) -> int:
+    # считается по частичному индексу ix_book_loans_user_id_active, возвращенные выдачи в него не попадают
+    return db.scalar(
+        select(func.count()).where(models.BookLoan.user_id == user_id, models.BookLoan.actual_return_date.is_(None))
+    )
+
+
+def _change_copies(db: Session, book_id: int, delta: int, *criteria) -> Optional[Row]:
+    return db.execute(
+        update(models.Book)
+        .where(models.Book.id == book_id, *criteria)
+        .values(available_copies=models.Book.available_copies + delta)
+        .returning(models.Book.id, models.Book.title, models.Book.available_copies)
+    ).first()
+
+
+def take_copy(db: Session, book_id: int) -> Optional[Row]:
+    # условие в самом UPDATE: параллельные выдачи не уводят остаток в минус
+    return _change_copies(db, book_id, -1, models.Book.available_copies > 0)
+
+
+def release_copy(db: Session, book_id: int) -> Optional[Row]:
+    return _change_copies(db, book_id, 1)
+
+
+def insert_loan(db: Session, user_id: int, book_id: int) -> Row:
+    today = date.today()
+    return db.execute(
+        insert(models.BookLoan)
+        .values(user_id=user_id, book_id=book_id, issue_date=today, estimated_return_date=today + LOAN_PERIOD)
+        .returning(*LOAN_COLUMNS)
+    ).one()
+
+
+def close_loan(db: Session, loan_id: int, user_id: int) -> Optional[Row]:
+    return db.execute(
+        update(models.BookLoan)
+        .where(models.BookLoan.id == loan_id, models.BookLoan.user_id == user_id,
+               models.BookLoan.actual_return_date.is_(None))
+        .values(actual_return_date=date.today())
+        .returning(*LOAN_COLUMNS)
+    ).first()
+
+
+def delete_loan(db: Session, loan_id: int) -> Optional[Row]:
+    return db.execute(delete(models.BookLoan).where(models.BookLoan.id == loan_id).returning(*LOAN_COLUMNS)).first()
+
+
+def _batch_error(item_id: int, status_code: int, detail: str) -> schemas.LoanBatchItem:
+    return schemas.LoanBatchItem(id=item_id, status_code=status_code, detail=detail)
+
+
+def _in_request_order(ids: list[int], results: dict[int, schemas.LoanBatchItem]) -> list[schemas.LoanBatchItem]:
+    items, seen = [], set()
+    for item_id in ids:
+        items.append(results[item_id] if item_id not in seen else
+                     _batch_error(item_id, status.HTTP_400_BAD_REQUEST, 'Duplicate id in request.'))
+        seen.add(item_id)
+    return items
+
+
+def borrow_books(db: Session, user_id: int, book_ids: list[int]) -> tuple[list[schemas.LoanBatchItem], list[Row]]:
+    results = {}
+    requested = list(dict.fromkeys(book_ids))
+    allowed = max(MAX_ACTIVE_LOANS - count_active_loans(db, user_id), 0)
+
+    books = []
+    if allowed:
+        # лимит расходуют только реально выданные книги: берутся первые allowed доступных книг в порядке запроса
+        candidates = (
+            select(models.Book.id)
+            .where(models.Book.id.in_(requested), models.Book.available_copies > 0)
+            .order_by(case({book_id: position for position, book_id in enumerate(requested)}, value=models.Book.id))
+            .limit(allowed)
+        )
+        books = db.execute(
+            update(models.Book)
+            .where(models.Book.id.in_(candidates), models.Book.available_copies > 0)
+            .values(available_copies=models.Book.available_copies - 1)
+            .returning(models.Book.id, models.Book.title, models.Book.available_copies)
+        ).all()
+    taken = {book.id for book in books}
+    missing = [book_id for book_id in requested if book_id not in taken]
+    if missing:
+        limit_detail = f"You can't borrow more than {MAX_ACTIVE_LOANS} books at the same time."
+        existing = dict(db.execute(
+            select(models.Book.id, models.Book.available_copies).where(models.Book.id.in_(missing))
+        ).tuples().all())
+        for book_id in missing:
+            if book_id not in existing:
+                results[book_id] = _batch_error(book_id, status.HTTP_404_NOT_FOUND, 'Book not found.')
+            elif existing[book_id] > 0:
+                # книга доступна, но не вошла в выдачу: на нее не хватило лимита
+                results[book_id] = _batch_error(book_id, status.HTTP_400_BAD_REQUEST, limit_detail)
+            else:
+                results[book_id] = _batch_error(book_id, status.HTTP_400_BAD_REQUEST,
+                                                'No available copies of the book.')
+
+    if books:
+        today = date.today()
+        loans = db.execute(
+            insert(models.BookLoan).returning(*LOAN_COLUMNS, sort_by_parameter_order=True),
+            [{'user_id': user_id, 'book_id': book.id, 'issue_date': today,
+              'estimated_return_date': today + LOAN_PERIOD} for book in books],
+        ).all()
+        for loan in loans:
+            results[loan.book_id] = schemas.LoanBatchItem(id=loan.book_id, status_code=status.HTTP_200_OK,
+                                                          loan=loan_out(loan))
+
+    return _in_request_order(book_ids, results), books
+
+
+def return_loans(db: Session, user_id: int, loan_ids: list[int]) -> tuple[list[schemas.LoanBatchItem], list[Row]]:
+    results = {}
+    requested = list(dict.fromkeys(loan_ids))
+    loans = db.execute(
+        update(models.BookLoan)
+        .where(models.BookLoan.id.in_(requested), models.BookLoan.user_id == user_id,
+               models.BookLoan.actual_return_date.is_(None))
+        .values(actual_return_date=date.today())
+        .returning(*LOAN_COLUMNS)
+    ).all()
+    for loan in loans:
+        results[loan.id] = schemas.LoanBatchItem(id=loan.id, status_code=status.HTTP_200_OK, loan=loan_out(loan))
+
+    missing = [loan_id for loan_id in requested if loan_id not in results]
+    if missing:
+        returned = set(db.scalars(
+            select(models.BookLoan.id).where(models.BookLoan.id.in_(missing), models.BookLoan.user_id == user_id)
+        ))
+        for loan_id in missing:
+            results[loan_id] = (_batch_error(loan_id, status.HTTP_400_BAD_REQUEST, 'You already returned this book')
+                                if loan_id in returned else
+                                _batch_error(loan_id, status.HTTP_404_NOT_FOUND,
+                                             'Loan not found or this loan does not belong to you.'))
+
+    books = []
+    if loans:
+        # одна книга может вернуться несколькими выдачами, поэтому прибавка считается по книгам
+        copies = Counter(loan.book_id for loan in loans)
+        books = db.execute(
+            update(models.Book)
+            .where(models.Book.id.in_(copies))
+            .values(available_copies=models.Book.available_copies + case(copies, value=models.Book.id))
+            .returning(models.Book.id, models.Book.title, models.Book.available_copies)
+        ).all()
+    return _in_request_order(loan_ids, results), books
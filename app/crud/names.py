@@ -0,0 +1,55 @@
+from collections import defaultdict
+from threading import Lock
+from typing import Iterable, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.config import settings
+from app.db import models
+from utils.cache import LRUCache
+
+
+class NameIdCache:
+    def __init__(self, model, maxsize: int, ttl: Optional[float] = None):
+        self.model = model
+        self.cache = LRUCache(maxsize, ttl=ttl)
+        self._generation = 0
+        self._lock = Lock()
+
+    def resolve(self, db: Session, names: Iterable[str]) -> dict[str, list[int]]:
+        resolved = {}
+        missing = set()
+        for name in set(names):
+            ids = self.cache.get(name)
+            if ids is None:
+                missing.add(name)
+            else:
+                resolved[name] = ids
+        if not missing:
+            return resolved
+
+        generation = self._generation
+        found = defaultdict(list)
+        for name, model_id in db.execute(select(self.model.name, self.model.id).where(self.model.name.in_(missing))):
+            found[name].append(model_id)
+        with self._lock:
+            if generation == self._generation:
+                for name, ids in found.items():
+                    self.cache.put(name, ids)
+        resolved.update(found)
+        return resolved
+
+    def invalidate(self, *names: str) -> None:
+        with self._lock:
+            self._generation += 1
+            for name in names:
+                self.cache.pop(name)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self.cache.clear()
+
+
+author_ids = NameIdCache(models.Author, settings.NAME_CACHE_SIZE, ttl=settings.NAME_CACHE_TTL)
+genre_ids = NameIdCache(models.Genre, settings.NAME_CACHE_SIZE, ttl=settings.NAME_CACHE_TTL)
@@ -0,0 +1,24 @@
+from sqlalchemy import TextClause, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from app.db.models import catalog_versions
+
+
+def bump_versions(db: Session, *tables: str) -> None:
+    db.execute(select(*(catalog_versions[table].next_value() for table in tables)))
+
+
+def _versions_query(*tables: str) -> TextClause:
+    columns = ', '.join(
+        f'(SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {catalog_versions[table].name})'
+        for table in tables
+    )
+    return text(f'SELECT {columns}')
+
+
+def current_versions(db: Session, *tables: str) -> tuple[int, ...]:
+    return tuple(db.execute(_versions_query(*tables)).one())
+
+
+async def current_versions_async(db: AsyncSession, *tables: str) -> tuple[int, ...]:
+    return tuple((await db.execute(_versions_query(*tables))).one())
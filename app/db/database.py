@@ -1,15 +1,33 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.db.pool import PoolMetrics, instrumented_pool
 
 DATABASE_URL = settings.DATABASE_URL
-engine = create_engine(DATABASE_URL)
+pool_metrics = PoolMetrics()
+engine = create_engine(DATABASE_URL, poolclass=instrumented_pool(QueuePool, pool_metrics), **settings.POOL_OPTIONS)
+pool_metrics.attach(engine)
 
 sync_session_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_pool_metrics = PoolMetrics()
+async_engine = create_async_engine(settings.ASYNC_DATABASE_URL,
+                                   poolclass=instrumented_pool(AsyncAdaptedQueuePool, async_pool_metrics),
+                                   **settings.POOL_OPTIONS)
+async_pool_metrics.attach(async_engine.sync_engine)
+
+async_session_maker = async_sessionmaker(autoflush=False, bind=async_engine)
+
 Base = declarative_base()
 
 
 def get_db():
     with sync_session_maker() as db:
         yield db
+
+
+async def get_async_db():
+    async with async_session_maker() as db:
+        yield db
@@ -1,47 +1,244 @@
+"""
+Генератор синтетических данных для нагрузочных проверок: жанры, авторы, книги, пользователи и история выдач.
+
+Строки загружаются через COPY пачками, пароль хэшируется один раз для всех пользователей. Популярность жанров,
+авторов, книг и активность читателей распределены по закону Ципфа, так что небольшая часть каталога получает
+большую часть связей и выдач. Один и тот же --seed на пустой базе и в тот же день дает те же данные.
+
+    python app/db/fixtures.py --books 1000000 --authors 100000 --users 500000 --loans 20000000
+"""
+import argparse
+import io
 import os
+import random
 import sys
+import time
+from datetime import date, timedelta
+from contextlib import contextmanager
+from itertools import accumulate
+from typing import Iterable, Iterator, Optional, Sequence
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
-from datetime import date
-from app.db.database import get_db
-from app.db.models import User, Book, Author, Genre, Role
+from sqlalchemy import Connection, text
+from app.crud.loan import LOAN_PERIOD, MAX_ACTIVE_LOANS
+from app.crud.versions import bump_versions
+from app.db.database import engine
 from utils.security import hash_password
 
+ADMIN = {'username': 'admin', 'email': 'admin@example.com'}
+DEFAULT_PASSWORD = 'hashedpassword'
+COPY_CHUNK_ROWS = 100_000
+HISTORY_DAYS = 3 * 365
+# доля выдач за последние 2 * LOAN_PERIOD, которые остаются на руках (если позволяют лимиты), часть из них просрочена
+ACTIVE_SHARE = 0.6
+LOADED_TABLES = ('genres', 'authors', 'books', 'books_genres', 'books_authors', 'users', 'book_loans')
+
+GENRES = ('Fiction', 'Fantasy', 'Science Fiction', 'Mystery', 'Thriller', 'Romance', 'Horror', 'Historical Fiction',
+          'Biography', 'Poetry', 'Drama', 'Adventure', 'Classics', 'Crime', 'Humor', 'Philosophy', 'Psychology',
+          'Science', 'History', 'Travel', 'Children', 'Young Adult', 'Graphic Novel', 'Essays', 'Religion',
+          'Economics', 'Politics', 'Art', 'Music', 'Cooking')
+FIRST_NAMES = ('Anna', 'Boris', 'Clara', 'David', 'Elena', 'Felix', 'Greta', 'Hugo', 'Irina', 'Jonas', 'Katya', 'Leo',
+               'Maria', 'Nikolai', 'Olga', 'Pavel', 'Rosa', 'Sergei', 'Tamara', 'Viktor', 'Yulia', 'Zoe')
+LAST_NAMES = ('Abbott', 'Belov', 'Carver', 'Dorn', 'Egorova', 'Fischer', 'Gray', 'Holt', 'Ivanova', 'Jensen', 'Keller',
+              'Lind', 'Morozov', 'Novak', 'Orlova', 'Park', 'Quinn', 'Reyes', 'Sokolov', 'Tanaka', 'Ulrich', 'Volkova',
+              'Weiss', 'Young', 'Zimmer')
+ADJECTIVES = ('silent', 'last', 'hidden', 'broken', 'golden', 'distant', 'forgotten', 'burning', 'quiet', 'endless',
+              'northern', 'crimson', 'lost', 'secret', 'wild', 'winter', 'glass', 'iron', 'paper', 'midnight')
+NOUNS = ('river', 'mountain', 'garden', 'shadow', 'empire', 'ocean', 'letters', 'machine', 'city', 'house', 'road',
+         'kingdom', 'island', 'forest', 'mirror', 'voyage', 'storm', 'orchard', 'harbor', 'station')
+
+
+class Skewed:
+    def __init__(self, rng: random.Random, ids: Sequence[int], exponent: float):
+        # ранги популярности перемешаны, иначе самыми популярными всегда оказывались бы первые id
+        self.rng = rng
+        self.ids = list(ids)
+        rng.shuffle(self.ids)
+        self.cum_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(self.ids) + 1)))
+
+    def pick(self, k: int) -> list[int]:
+        return self.rng.choices(self.ids, cum_weights=self.cum_weights, k=k)
+
+    def pick_distinct(self, k: int) -> list[int]:
+        return list(dict.fromkeys(self.pick(k)))
+
+
+def _copy(connection: Connection, table: str, columns: Sequence[str], rows: Iterable[tuple]) -> int:
+    statement = f"COPY {table} ({', '.join(columns)}) FROM STDIN"
+    buffer, count = io.StringIO(), 0
+    with connection.connection.cursor() as cursor:
+        for count, row in enumerate(rows, 1):
+            buffer.write('\t'.join('\\N' if value is None else str(value) for value in row))
+            buffer.write('\n')
+            if count % COPY_CHUNK_ROWS == 0:
+                buffer.seek(0)
+                cursor.copy_expert(statement, buffer)
+                buffer = io.StringIO()
+        buffer.seek(0)
+        cursor.copy_expert(statement, buffer)
+    return count
+
+
+@contextmanager
+def _deferred_indexes(connection: Connection, tables: Sequence[str]) -> Iterator[None]:
+    # построчная проверка внешних ключей и обновление индексов обходятся дороже, чем одно построение после загрузки;
+    # все происходит в той же транзакции, при ошибке исходные индексы возвращает откат
+    names = {'tables': list(tables)}
+    indexes = connection.execute(text(
+        'SELECT indexname, indexdef FROM pg_indexes WHERE tablename = ANY(:tables) AND indexname NOT IN '
+        "(SELECT conname FROM pg_constraint WHERE contype IN ('p', 'u'))"
+    ), names).all()
+    foreign_keys = connection.execute(text(
+        "SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE contype = 'f' AND conrelid::regclass::text = ANY(:tables)"
+    ), names).all()
+    for table, name, _ in foreign_keys:
+        connection.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT {name}'))
+    for name, _ in indexes:
+        connection.execute(text(f'DROP INDEX {name}'))
+    yield
+    for _, definition in indexes:
+        connection.execute(text(definition))
+    for table, name, definition in foreign_keys:
+        connection.execute(text(f'ALTER TABLE {table} ADD CONSTRAINT {name} {definition}'))
+
+
+def _last_id(connection: Connection, table: str) -> int:
+    return connection.scalar(text(f'SELECT coalesce(max(id), 0) FROM {table}'))
+
+
+def _genres(connection: Connection, rng: random.Random, first_id: int, count: int) -> Iterator[tuple]:
+    taken = set(connection.scalars(text('SELECT name FROM genres')))
+    for i in range(count):
+        name = GENRES[i % len(GENRES)]
+        if i >= len(GENRES):
+            name = f'{rng.choice(ADJECTIVES).title()} {name}'
+        if name in taken:
+            name = f'{name} {first_id + i}'
+        taken.add(name)
+        yield first_id + i, name
+
+
+def _authors(rng: random.Random, first_id: int, count: int) -> Iterator[tuple]:
+    for author_id in range(first_id, first_id + count):
+        name = f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}'
+        biography = f'{name} writes about the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}.'
+        birth_date = date(1900, 1, 1) + timedelta(days=rng.randrange(100 * 365))
+        yield author_id, name, biography, birth_date
+
+
+def _books(rng: random.Random, first_id: int, copies: list[int]) -> Iterator[tuple]:
+    for offset, book_copies in enumerate(copies):
+        adjective, noun = rng.choice(ADJECTIVES), rng.choice(NOUNS)
+        title = rng.choice((f'The {adjective.title()} {noun.title()}', f'{noun.title()} of the {adjective.title()}',
+                            f'{adjective.title()} {noun.title()}s'))
+        description = f'A story about the {adjective} {noun} and the {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}.'
+        publication_date = date(1950, 1, 1) + timedelta(days=rng.randrange(75 * 365))
+        yield first_id + offset, title, description, publication_date, book_copies
+
+
+def _links(rng: random.Random, book_ids: range, popularity: Skewed, most: int) -> Iterator[tuple]:
+    for book_id in book_ids:
+        for linked_id in popularity.pick_distinct(rng.randint(1, most)):
+            yield book_id, linked_id
+
+
+def _users(first_id: int, count: int, hashed_password: str) -> Iterator[tuple]:
+    for user_id in range(first_id, first_id + count):
+        yield user_id, f'reader_{user_id}', f'reader_{user_id}@example.com', hashed_password, 'READER'
+
+
+def _loans(rng: random.Random, first_id: int, count: int, books: Skewed, readers: Skewed, copies: list[int],
+           first_book_id: int, today: date) -> Iterator[tuple]:
+    # на руках у читателя не больше MAX_ACTIVE_LOANS книг, по книге не больше ее копий
+    user_active, book_active = {}, bytearray(len(copies))
+    loan_days = LOAN_PERIOD.days
+    days = {offset: (today - timedelta(days=offset)).isoformat() for offset in range(-loan_days, HISTORY_DAYS)}
+    loan_id = first_id
+    for chunk in range(0, count, COPY_CHUNK_ROWS):
+        size = min(COPY_CHUNK_ROWS, count - chunk)
+        for book_id, user_id in zip(books.pick(size), readers.pick(size)):
+            issued = rng.randrange(HISTORY_DAYS)
+            book = book_id - first_book_id
+            returned = max(issued - rng.randint(1, loan_days + 7), 0)
+            if (issued < 2 * loan_days and rng.random() < ACTIVE_SHARE and book_active[book] < copies[book]
+                    and user_active.get(user_id, 0) < MAX_ACTIVE_LOANS):
+                book_active[book] += 1
+                user_active[user_id] = user_active.get(user_id, 0) + 1
+                returned = None
+            yield (loan_id, user_id, book_id, days[issued], days[issued - loan_days],
+                   None if returned is None else days[returned])
+            loan_id += 1
 
-def fill_database():
-    with next(get_db()) as db:
-        genre1 = Genre(name="Fiction")
-        genre2 = Genre(name="Science Fiction")
-        genre3 = Genre(name="Fantasy")
 
-        author1 = Author(name="Author 1", biography="Biography of Author 1", birth_date=date(1970, 5, 1))
-        author2 = Author(name="Author 2", biography="Biography of Author 2", birth_date=date(1980, 8, 12))
+def fill_database(connection: Connection, genres: int, authors: int, books: int, users: int, loans: int,
+                  seed: int = 0, password: str = DEFAULT_PASSWORD, today: Optional[date] = None) -> dict[str, int]:
+    rng = random.Random(seed)
+    today = today or date.today()
+    first = {table: _last_id(connection, table) + 1 for table in ('genres', 'authors', 'books', 'users', 'book_loans')}
+    book_ids = range(first['books'], first['books'] + books)
+    hashed_password = hash_password(password)
 
-        book1 = Book(title="Book 1", description="Description of Book 1", publication_date=date(2000, 1, 1),
-                     available_copies=5)
-        book2 = Book(title="Book 2", description="Description of Book 2", publication_date=date(2005, 6, 15),
-                     available_copies=3)
+    with _deferred_indexes(connection, LOADED_TABLES):
+        _copy(connection, 'genres', ('id', 'name'), _genres(connection, rng, first['genres'], genres))
+        _copy(connection, 'authors', ('id', 'name', 'biography', 'birth_date'),
+              _authors(rng, first['authors'], authors))
+        copies = [1 + min(int(rng.paretovariate(1.5)), 19) for _ in book_ids]
+        _copy(connection, 'books', ('id', 'title', 'description', 'publication_date', 'available_copies'),
+              _books(rng, first['books'], copies))
+        if genres:
+            _copy(connection, 'books_genres', ('book_id', 'genre_id'),
+                  _links(rng, book_ids, Skewed(rng, range(first['genres'], first['genres'] + genres), 1.1), 3))
+        if authors:
+            _copy(connection, 'books_authors', ('book_id', 'author_id'),
+                  _links(rng, book_ids, Skewed(rng, range(first['authors'], first['authors'] + authors), 1.0), 2))
 
-        user1 = User(username="admin", email="admin@example.com", hashed_password=hash_password("hashedpassword"),
-                     role=Role.ADMIN)
-        user2 = User(username="reader1", email="reader1@example.com", hashed_password=hash_password("hashedpassword"),
-                     role=Role.READER)
-        user3 = User(username="reader2", email="reader2@example.com", hashed_password=hash_password("hashedpassword"),
-                     role=Role.READER)
+        _copy(connection, 'users', ('id', 'username', 'email', 'hashed_password', 'role'),
+              _users(first['users'], users, hashed_password))
+        if not connection.scalar(text('SELECT 1 FROM users WHERE username = :username OR email = :email'), ADMIN):
+            connection.execute(text("INSERT INTO users (id, username, email, hashed_password, role) "
+                                    "VALUES (:id, :username, :email, :hashed_password, 'ADMIN')"),
+                               {**ADMIN, 'id': first['users'] + users, 'hashed_password': hashed_password})
 
-        book1.genres.append(genre1)
-        book1.genres.append(genre2)
-        book2.genres.append(genre3)
+        if books and users and loans:
+            _copy(connection, 'book_loans',
+                  ('id', 'user_id', 'book_id', 'issue_date', 'estimated_return_date', 'actual_return_date'),
+                  _loans(rng, first['book_loans'], loans, Skewed(rng, book_ids, 1.0),
+                         Skewed(rng, range(first['users'], first['users'] + users), 0.8), copies, first['books'],
+                         today))
+            connection.execute(text(
+                'UPDATE books SET available_copies = books.available_copies - active.loans '
+                'FROM (SELECT book_id, count(*) AS loans FROM book_loans '
+                'WHERE actual_return_date IS NULL AND id >= :first_id GROUP BY book_id) AS active '
+                'WHERE books.id = active.book_id'
+            ), {'first_id': first['book_loans']})
 
-        author1.books.append(book1)
-        author2.books.append(book2)
+    # id выставлялись явно, последовательности нужно догнать до новых значений
+    for table in first:
+        connection.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                                f"(SELECT coalesce(max(id), 1) FROM {table}))"))
+    bump_versions(connection, 'books', 'authors', 'genres')
+    connection.execute(text(f"ANALYZE {', '.join(LOADED_TABLES)}"))
+    return first
 
-        db.add_all([genre1, genre2, genre3, author1, author2, book1, book2, user1, user2, user3])
 
-        db.commit()
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--genres', type=int, default=50)
+    parser.add_argument('--authors', type=int, default=2000)
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--password', default=DEFAULT_PASSWORD, help='password of every generated user and admin')
+    args = parser.parse_args()
 
-        print("Database has been filled with test data.")
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        fill_database(connection, args.genres, args.authors, args.books, args.users, args.loans, args.seed,
+                      args.password)
+    print(f'Database has been filled with test data in {time.perf_counter() - started:.1f}s.')
 
 
-if __name__ == "__main__":
-    fill_database()
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,28 @@
-from sqlalchemy import String, Integer, Date, ForeignKey, Text, BigInteger, Table, Column, Enum as AlchEnum
+from sqlalchemy import (String, Integer, Date, ForeignKey, Text, BigInteger, Table, Column, Computed, Index, Sequence,
+                        Enum as AlchEnum)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from enum import Enum
 from app.db.database import Base
 
 
+SEARCH_CONFIG = 'simple'
+
+
+def search_document(*columns: str) -> Computed:
+    weighted = (
+        f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({column}, '')), '{weight}')"
+        for column, weight in zip(columns, 'ABCD')
+    )
+    return Computed(' || '.join(weighted), persisted=True)
+
+
+catalog_versions = {
+    table: Sequence(f'{table}_version_seq', metadata=Base.metadata)
+    for table in ('books', 'authors', 'genres')
+}
+
+
 class Role(Enum):
     ADMIN = 'admin'
     READER = 'reader'
@@ -14,6 +33,8 @@ books_genres = Table(
     Base.metadata,
     Column('book_id', ForeignKey('books.id'), primary_key=True),
     Column('genre_id', ForeignKey('genres.id'), primary_key=True),
+    # первичный ключ начинается с book_id, для выборки книг жанра нужен обратный порядок
+    Index('ix_books_genres_genre_id', 'genre_id', 'book_id'),
 )
 
 books_authors = Table(
@@ -21,6 +42,8 @@ books_authors = Table(
     Base.metadata,
     Column('author_id', ForeignKey('authors.id'), primary_key=True),
     Column('book_id', ForeignKey('books.id'), primary_key=True),
+    # первичный ключ начинается с author_id, для авторов книги нужен обратный порядок
+    Index('ix_books_authors_book_id', 'book_id', 'author_id'),
 )
 
 
@@ -44,6 +67,11 @@ class Book(Base):
     loans: Mapped[list['BookLoan']] = relationship(back_populates='book')
     authors: Mapped[list['Author']] = relationship(secondary=books_authors, back_populates='books')
 
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, search_document('title', 'description'), nullable=True,
+                                               deferred=True)
+
+    __table_args__ = (Index('ix_books_search_vector', 'search_vector', postgresql_using='gin'),)
+
 
 class User(Base):
     __tablename__ = 'users'
@@ -67,16 +95,29 @@ class Author(Base):
 
     books: Mapped[list[Book]] = relationship(secondary=books_authors, back_populates='authors')
 
+    search_vector: Mapped[str] = mapped_column(TSVECTOR, search_document('name', 'biography'), nullable=True,
+                                               deferred=True)
+
+    __table_args__ = (Index('ix_authors_search_vector', 'search_vector', postgresql_using='gin'),)
+
 
 class BookLoan(Base):
     __tablename__ = 'book_loans'
 
     id: Mapped[int] = mapped_column(BigInteger, primary_key=True, index=True)
     user_id: Mapped[int] = mapped_column(ForeignKey('users.id'), nullable=False)
-    book_id: Mapped[int] = mapped_column(ForeignKey('books.id'), nullable=False)
+    book_id: Mapped[int] = mapped_column(ForeignKey('books.id'), nullable=False, index=True)
     issue_date: Mapped[Date] = mapped_column(Date, nullable=False)
-    estimated_return_date: Mapped[Date] = mapped_column(Date, nullable=False)
+    estimated_return_date: Mapped[Date] = mapped_column(Date, nullable=False, index=True)
     actual_return_date: Mapped[Date] = mapped_column(Date, nullable=True)
 
     user: Mapped['User'] = relationship(back_populates='borrowed_books')
     book: Mapped['Book'] = relationship(back_populates='loans')
+
+    __table_args__ = (
+        # выдачи пользователя постранично по id
+        Index('ix_book_loans_user_id_id', 'user_id', 'id'),
+        Index('ix_book_loans_user_id_active', 'user_id', postgresql_where=actual_return_date.is_(None)),
+        # отчет о просрочках идет по id среди невозвращенных выдач, дата проверяется прямо по индексу
+        Index('ix_book_loans_overdue', 'id', 'estimated_return_date', postgresql_where=actual_return_date.is_(None)),
+    )
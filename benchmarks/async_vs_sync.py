@@ -0,0 +1,117 @@
+"""
+Сравнение пропускной способности синхронного (DB_ASYNC=0) и асинхронного (DB_ASYNC=1) режимов.
+
+Запускает uvicorn с одинаковым числом воркеров в каждом режиме и нагружает один эндпоинт
+параллельными httpx-клиентами. База берется из .env и должна быть заполнена заранее
+(например, python app/db/fixtures.py).
+
+    python benchmarks/async_vs_sync.py --workers 2 --concurrency 64 --duration 20 --path /books
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Optional
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BENCH_USER = {'username': 'bench_user', 'email': 'bench_user@example.com', 'password': 'bench_password'}
+
+
+def start_server(mode: str, workers: int, port: int, extra_env: Optional[dict] = None) -> subprocess.Popen:
+    env = {**os.environ, 'DB_ASYNC': '1' if mode == 'async' else '0', **(extra_env or {})}
+    return subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--workers', str(workers),
+         '--log-level', 'warning'],
+        cwd=ROOT, env=env,
+    )
+
+
+def wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'{base_url}/docs', timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Server at {base_url} did not start in {timeout}s')
+
+
+def summary(latencies: list, errors: int, duration: float) -> dict:
+    # quantiles требует хотя бы двух замеров; у редкого эндпоинта их может быть меньше
+    quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(quantiles[49] * 1000, 2),
+        'p95_ms': round(quantiles[94] * 1000, 2),
+        'p99_ms': round(quantiles[98] * 1000, 2),
+    }
+
+
+def get_token(base_url: str) -> str:
+    httpx.post(f'{base_url}/register', json=BENCH_USER)
+    response = httpx.post(f'{base_url}/login', json={'username': BENCH_USER['username'],
+                                                     'password': BENCH_USER['password']})
+    response.raise_for_status()
+    return response.json()['access_token']
+
+
+async def run_load(base_url: str, path: str, token: str, concurrency: int, duration: float) -> dict:
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await client.get(path)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, headers={'Authorization': f'Bearer {token}'}, limits=limits,
+                                 timeout=30) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return summary(latencies, errors, duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--path', default='/books')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--output', help='JSON file for the results')
+    args = parser.parse_args()
+
+    results = {}
+    for mode in ('sync', 'async'):
+        base_url = f'http://127.0.0.1:{args.port}'
+        server = start_server(mode, args.workers, args.port)
+        try:
+            wait_ready(base_url)
+            token = get_token(base_url)
+            results[mode] = asyncio.run(run_load(base_url, args.path, token, args.concurrency, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{mode:>5}: {results[mode]}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
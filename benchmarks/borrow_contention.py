@@ -0,0 +1,113 @@
+"""
+Нагрузка на выдачу одной популярной книги: читатели в цикле берут и возвращают ее параллельно.
+
+Создает книгу с заданным числом копий и читателей прямо в базе из .env, затем запускает uvicorn
+и считает выдачи в секунду и задержки запросов. В конце сверяет остаток копий с числом незакрытых выдач.
+
+    python benchmarks/borrow_contention.py --copies 5 --readers 50 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from async_vs_sync import start_server, summary, wait_ready
+from app.db import models
+from app.db.database import sync_session_maker
+from utils.security import create_access_token
+
+
+def create_fixtures(copies: int, readers: int) -> tuple[int, list[str]]:
+    run_id = uuid.uuid4().hex[:8]
+    with sync_session_maker() as db:
+        book = models.Book(title=f'Borrow benchmark {run_id}', available_copies=copies)
+        users = [
+            models.User(username=f'borrow_{run_id}_{i}', email=f'borrow_{run_id}_{i}@example.com', hashed_password='-')
+            for i in range(readers)
+        ]
+        db.add_all([book, *users])
+        db.commit()
+        tokens = [create_access_token(data={'sub': user.username, 'uid': user.id, 'role': 'reader'}) for user in users]
+        return book.id, tokens
+
+
+def check_consistency(book_id: int, copies: int) -> dict:
+    with sync_session_maker() as db:
+        available = db.get(models.Book, book_id).available_copies
+        open_loans = db.query(models.BookLoan).filter(models.BookLoan.book_id == book_id,
+                                                      models.BookLoan.actual_return_date.is_(None)).count()
+    return {'available_copies': available, 'open_loans': open_loans, 'consistent': available + open_loans == copies}
+
+
+async def run_load(base_url: str, book_id: int, tokens: list[str], duration: float) -> dict:
+    latencies = []
+    borrowed = rejected = errors = 0
+    deadline = time.monotonic() + duration
+
+    async def reader(client: httpx.AsyncClient, token: str):
+        nonlocal borrowed, rejected, errors
+        headers = {'Authorization': f'Bearer {token}'}
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await client.post(f'/loans/borrow/{book_id}', headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code == 400:
+                rejected += 1
+                continue
+            if response.status_code != 200:
+                errors += 1
+                continue
+            borrowed += 1
+            started = time.perf_counter()
+            response = await client.post(f"/loans/return/{response.json()['loan_id']}", headers=headers)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=len(tokens)),
+                                 timeout=30) as client:
+        await asyncio.gather(*(reader(client, token) for token in tokens))
+
+    return {
+        **summary(latencies, errors, duration),
+        'borrows': borrowed,
+        'rejected': rejected,
+        'borrows_per_s': round(borrowed / duration, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--copies', type=int, default=5)
+    parser.add_argument('--readers', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--output', help='JSON file for the results')
+    args = parser.parse_args()
+
+    book_id, tokens = create_fixtures(args.copies, args.readers)
+    base_url = f'http://127.0.0.1:{args.port}'
+    server = start_server('sync', args.workers, args.port)
+    try:
+        wait_ready(base_url)
+        results = asyncio.run(run_load(base_url, book_id, tokens, args.duration))
+    finally:
+        server.terminate()
+        server.wait()
+    results.update(check_consistency(book_id, args.copies))
+    print(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
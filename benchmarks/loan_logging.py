@@ -0,0 +1,46 @@
+"""
+Задержка выдачи и возврата книг с включенным (LOG_LEVEL=INFO) и выключенным (LOG_LEVEL=WARNING) логированием.
+
+Создает книгу и читателей прямо в базе из .env, затем для каждого режима запускает uvicorn и гоняет
+циклы выдача -> возврат. Каждая операция пишет запись в лог только в режиме INFO.
+
+    python benchmarks/loan_logging.py --readers 16 --duration 20
+"""
+import argparse
+import asyncio
+import json
+
+from async_vs_sync import start_server, wait_ready
+from borrow_contention import create_fixtures, run_load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--output', help='JSON file for the results')
+    args = parser.parse_args()
+
+    # копий столько же, сколько читателей: меряется логирование, а не конкуренция за книгу
+    book_id, tokens = create_fixtures(args.readers, args.readers)
+    base_url = f'http://127.0.0.1:{args.port}'
+    results = {}
+    for mode, level in (('logging_on', 'INFO'), ('logging_off', 'WARNING')):
+        server = start_server('sync', args.workers, args.port, {'LOG_LEVEL': level})
+        try:
+            wait_ready(base_url)
+            results[mode] = asyncio.run(run_load(base_url, book_id, tokens, args.duration))
+        finally:
+            server.terminate()
+            server.wait()
+        print(f'{mode:>11}: {results[mode]}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
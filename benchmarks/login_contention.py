@@ -0,0 +1,83 @@
+"""
+Пропускная способность логина под нагрузкой и его влияние на чтение каталога.
+
+Запускает uvicorn, сначала замеряет чтение каталога без логинов, затем одновременно с потоком логинов.
+Число раундов bcrypt и размер пула хэширования задаются через BCRYPT_ROUNDS и PASSWORD_HASH_WORKERS.
+
+    python benchmarks/login_contention.py --login-concurrency 32 --read-concurrency 16 --duration 20
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import httpx
+
+from async_vs_sync import BENCH_USER, get_token, start_server, summary, wait_ready
+
+
+async def load(base_url: str, send, concurrency: int, deadline: float) -> tuple[list, int]:
+    latencies = []
+    errors = 0
+
+    async def worker(client: httpx.AsyncClient):
+        nonlocal errors
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            response = await send(client)
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=concurrency),
+                                 timeout=60) as client:
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+    return latencies, errors
+
+
+async def run(base_url: str, path: str, token: str, args, with_logins: bool) -> dict:
+    deadline = time.monotonic() + args.duration
+    credentials = {'username': BENCH_USER['username'], 'password': BENCH_USER['password']}
+    headers = {'Authorization': f'Bearer {token}'}
+
+    reads = load(base_url, lambda client: client.get(path, headers=headers), args.read_concurrency, deadline)
+    if not with_logins:
+        return {'reads': summary(*await reads, args.duration)}
+    logins = load(base_url, lambda client: client.post('/login', json=credentials), args.login_concurrency, deadline)
+    read_result, login_result = await asyncio.gather(reads, logins)
+    return {'reads': summary(*read_result, args.duration), 'logins': summary(*login_result, args.duration)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--login-concurrency', type=int, default=32)
+    parser.add_argument('--read-concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--path', default='/books')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--output', help='JSON file for the results')
+    args = parser.parse_args()
+
+    base_url = f'http://127.0.0.1:{args.port}'
+    server = start_server('sync', args.workers, args.port)
+    try:
+        wait_ready(base_url)
+        token = get_token(base_url)
+        results = {
+            'baseline': asyncio.run(run(base_url, args.path, token, args, with_logins=False)),
+            'contention': asyncio.run(run(base_url, args.path, token, args, with_logins=True)),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+    for name, result in results.items():
+        print(f'{name:>10}: {result}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
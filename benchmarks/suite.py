@@ -0,0 +1,248 @@
+"""
+Нагрузочный набор сценариев для API: просмотр каталога, поиск, гонка выдач и возвратов, всплеск логинов.
+
+Наполняет базу из .env данными заданного масштаба (повторный запуск с тем же масштабом ничего не добавляет),
+запускает uvicorn с main:app и для каждого сценария гоняет параллельные httpx-клиенты. По каждому эндпоинту
+пишет RPS и p50/p95/p99 в JSON вместе с коммитом и параметрами запуска. Случайные выборы фиксируются --seed,
+поэтому прогоны на разных коммитах сравнимы; --compare сверяет результат с прошлым файлом и завершается
+с кодом 1, если p95 какого-то эндпоинта вырос больше допуска.
+
+    python benchmarks/suite.py --scale 10000 --concurrency 32 --duration 15 --output bench.json
+    python benchmarks/suite.py --scale 10000 --output new.json --compare bench.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from async_vs_sync import ROOT, start_server, summary, wait_ready
+from sqlalchemy import func, select, text
+from app.db import models
+from app.db.database import sync_session_maker
+from utils.security import create_access_token
+
+SEARCH_WORDS = ('river', 'mountain', 'winter', 'garden', 'shadow', 'empire', 'ocean', 'letters', 'machine', 'silence')
+HOT_BOOKS = 10
+LOGIN_USER = {'username': 'bench_login', 'email': 'bench_login@example.com', 'password': 'bench_password'}
+
+SEED = [
+    "INSERT INTO genres (name) SELECT 'Bench Genre ' || i FROM generate_series(1, 50) i",
+    "INSERT INTO authors (name, biography) SELECT 'Bench Author ' || i, 'Biography ' || i "
+    "FROM generate_series(1, greatest(:scale / 5, 1)) i",
+    "INSERT INTO books (title, description, available_copies) "
+    "SELECT 'Bench Book ' || i, 'A story about ' || (:words)[1 + i % cardinality(:words)] || ' and ' "
+    "|| (:words)[1 + (i / 7) % cardinality(:words)], CASE WHEN i <= :hot THEN 3 ELSE 20 END "
+    "FROM generate_series(1, :scale) i",
+    "INSERT INTO books_genres (book_id, genre_id) SELECT b.id, g.id "
+    "FROM (SELECT id, row_number() OVER (ORDER BY id) AS n FROM books WHERE title LIKE 'Bench Book %') b "
+    "JOIN (SELECT id, row_number() OVER (ORDER BY id) AS n FROM genres WHERE name LIKE 'Bench Genre %') g "
+    "ON g.n = b.n % 50 + 1",
+    "INSERT INTO books_authors (book_id, author_id) SELECT b.id, a.id "
+    "FROM (SELECT id, row_number() OVER (ORDER BY id) AS n FROM books WHERE title LIKE 'Bench Book %') b "
+    "JOIN (SELECT id, row_number() OVER (ORDER BY id) AS n FROM authors WHERE name LIKE 'Bench Author %') a "
+    "ON a.n = b.n % greatest(:scale / 5, 1) + 1",
+]
+
+
+def seed(scale: int, readers: int) -> dict:
+    with sync_session_maker() as db:
+        seeded = db.scalar(select(func.count()).where(models.Book.title.like('Bench Book %')))
+        if seeded and seeded != scale:
+            raise SystemExit(f'Database already holds {seeded} bench books; use --scale {seeded} or a clean database')
+        if not seeded:
+            for statement in SEED:
+                db.execute(text(statement), {'scale': scale, 'hot': HOT_BOOKS, 'words': list(SEARCH_WORDS)})
+            db.commit()
+            db.execute(text('ANALYZE'))
+
+        names = [f'bench_reader_{i}' for i in range(readers)] + ['bench_admin']
+        existing = set(db.scalars(select(models.User.username).where(models.User.username.in_(names))))
+        db.add_all([
+            models.User(username=name, email=f'{name}@example.com', hashed_password='-',
+                        role=models.Role.ADMIN if name == 'bench_admin' else models.Role.READER)
+            for name in names if name not in existing
+        ])
+        db.commit()
+        users = dict(db.execute(select(models.User.username, models.User.id)
+                                .where(models.User.username.in_(names))).tuples().all())
+        book_ids = list(db.scalars(select(models.Book.id).where(models.Book.title.like('Bench Book %'))
+                                   .order_by(models.Book.id)))
+
+    def token(name: str, role: str) -> str:
+        return create_access_token(data={'sub': name, 'uid': users[name], 'role': role}, token_life_time=24 * 60)
+
+    return {
+        'book_ids': book_ids,
+        'readers': [token(f'bench_reader_{i}', 'reader') for i in range(readers)],
+        'admin': token('bench_admin', 'admin'),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.rejected = defaultdict(int)
+        self.recording = False
+
+    async def call(self, client: httpx.AsyncClient, label: str, method: str, url: str,
+                   expected=(200,), tolerated=(), **kwargs) -> httpx.Response:
+        started = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        if self.recording:
+            self.latencies[label].append(time.perf_counter() - started)
+            if response.status_code in tolerated:
+                self.rejected[label] += 1
+            elif response.status_code not in expected:
+                self.errors[label] += 1
+        return response
+
+    def report(self, duration: float) -> dict:
+        return {
+            label: {**summary(latencies, self.errors[label], duration), 'rejected': self.rejected[label]}
+            for label, latencies in sorted(self.latencies.items())
+        }
+
+
+async def browse(client, recorder, rng, data, reader):
+    headers = {'Authorization': f'Bearer {reader}'}
+    pages = max(len(data['book_ids']) // 50, 1)
+    await recorder.call(client, 'GET /books?page', 'GET', '/books',
+                        params={'page': rng.randint(1, min(pages, 20)), 'size': 50}, headers=headers)
+    cursor = ''
+    for _ in range(rng.randint(1, 5)):
+        response = await recorder.call(client, 'GET /books?cursor', 'GET', '/books',
+                                       params={'cursor': cursor, 'size': 50}, headers=headers)
+        cursor = response.json().get('next_cursor') if response.status_code == 200 else None
+        if not cursor:
+            break
+    await recorder.call(client, 'GET /authors', 'GET', '/authors', params={'page': 1, 'size': 50}, headers=headers)
+    await recorder.call(client, 'GET /genres', 'GET', '/genres', headers={'Authorization': f"Bearer {data['admin']}"})
+
+
+async def search(client, recorder, rng, data, reader):
+    await recorder.call(client, 'GET /books?search', 'GET', '/books', params={'search': rng.choice(SEARCH_WORDS)},
+                        headers={'Authorization': f'Bearer {reader}'}, tolerated=(404,))
+
+
+async def borrow_return(client, recorder, rng, data, reader):
+    headers = {'Authorization': f'Bearer {reader}'}
+    book_id = rng.choice(data['book_ids'][:HOT_BOOKS])
+    response = await recorder.call(client, 'POST /loans/borrow/{book_id}', 'POST', f'/loans/borrow/{book_id}',
+                                   headers=headers, tolerated=(400,))
+    if response.status_code == 200:
+        await recorder.call(client, 'POST /loans/return/{loan_id}', 'POST',
+                            f"/loans/return/{response.json()['loan_id']}", headers=headers)
+
+
+async def login(client, recorder, rng, data, reader):
+    await recorder.call(client, 'POST /login', 'POST', '/login',
+                        json={'username': LOGIN_USER['username'], 'password': LOGIN_USER['password']})
+
+
+SCENARIOS = {
+    'browse': [(browse, 1)],
+    'search': [(search, 1)],
+    'loans': [(borrow_return, 1)],
+    'login': [(login, 1)],
+    'mixed': [(browse, 6), (search, 2), (borrow_return, 2), (login, 1)],
+}
+
+
+async def run_scenario(base_url: str, name: str, data: dict, args) -> dict:
+    steps, weights = zip(*SCENARIOS[name])
+    recorder = Recorder()
+
+    async def worker(client: httpx.AsyncClient, index: int, deadline: float):
+        rng = random.Random(f'{args.seed}-{name}-{index}')
+        reader = data['readers'][index % len(data['readers'])]
+        while time.monotonic() < deadline:
+            step = rng.choices(steps, weights)[0]
+            await step(client, recorder, rng, data, reader)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=args.concurrency),
+                                 timeout=60) as client:
+        for recording, duration in ((False, args.warmup), (True, args.duration)):
+            recorder.recording = recording
+            deadline = time.monotonic() + duration
+            await asyncio.gather(*(worker(client, index, deadline) for index in range(args.concurrency)))
+    return recorder.report(args.duration)
+
+
+def git_commit() -> str:
+    result = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or 'unknown'
+
+
+def compare(results: dict, baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)['scenarios']
+    regressions = []
+    for scenario, endpoints in results.items():
+        for label, stats in endpoints.items():
+            old = baseline.get(scenario, {}).get(label)
+            if not old or not old['p95_ms']:
+                continue
+            change = stats['p95_ms'] / old['p95_ms'] - 1
+            print(f'{scenario:>8} {label:<32} p95 {old["p95_ms"]:>9.2f} -> {stats["p95_ms"]:>9.2f} ms ({change:+.0%})')
+            if change > tolerance:
+                regressions.append(f'{scenario} {label}: p95 {old["p95_ms"]} -> {stats["p95_ms"]} ms')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10000, help='number of books to seed')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15, help='recorded seconds per scenario')
+    parser.add_argument('--warmup', type=float, default=3, help='unrecorded seconds before each scenario')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--mode', choices=('sync', 'async'), default='sync')
+    parser.add_argument('--port', type=int, default=8100)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default='bench.json', help='JSON file for the results')
+    parser.add_argument('--compare', help='previous results to compare p95 against')
+    parser.add_argument('--tolerance', type=float, default=0.15, help='allowed relative p95 growth')
+    args = parser.parse_args()
+
+    data = seed(args.scale, args.concurrency)
+    base_url = f'http://127.0.0.1:{args.port}'
+    server = start_server(args.mode, args.workers, args.port, {'LOG_LEVEL': 'WARNING'})
+    results = {}
+    try:
+        wait_ready(base_url)
+        httpx.post(f'{base_url}/register', json=LOGIN_USER)
+        for name in args.scenarios:
+            results[name] = asyncio.run(run_scenario(base_url, name, data, args))
+            for label, stats in results[name].items():
+                print(f'{name:>8} {label:<32} {stats}')
+    finally:
+        server.terminate()
+        server.wait()
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'meta': {'commit': git_commit(), 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                     'python': platform.python_version(), 'args': vars(args)},
+            'scenarios': results,
+        }, f, indent=2)
+
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        if regressions:
+            print('p95 regressions:', *regressions, sep='\n  ')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
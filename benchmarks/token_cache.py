@@ -0,0 +1,36 @@
+"""
+Микробенчмарк проверки JWT: полная расшифровка jwt.decode против verify_token с кэшем расшифрованных токенов.
+
+    python benchmarks/token_cache.py --iterations 100000
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import jwt
+from utils.security import ALGORITHM, SECRET_KEY, create_access_token, decoded_tokens, verify_token
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=100000)
+    args = parser.parse_args()
+
+    token = create_access_token(data={'sub': 'bench_user', 'role': 'reader'})
+    verify_token(token)
+
+    decode = timeit.timeit(lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), number=args.iterations)
+    cached = timeit.timeit(lambda: verify_token(token), number=args.iterations)
+
+    per_decode = decode / args.iterations * 1e6
+    per_cached = cached / args.iterations * 1e6
+    print(f'jwt.decode:          {per_decode:.2f} us/request')
+    print(f'verify_token cached: {per_cached:.2f} us/request')
+    print(f'saved:               {per_decode - per_cached:.2f} us/request ({per_decode / per_cached:.1f}x)')
+    print(f'cache: {decoded_tokens.stats()}')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,67 @@
+import atexit
+import datetime
+import json
 import logging
 import sys
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from app.core.config import settings
 
-logger = logging.getLogger()
-logger.setLevel(logging.INFO)
+# атрибуты, которые есть у любой записи; все остальное пришло через extra и попадает в JSON отдельными полями
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
 
-file_handler = logging.FileHandler("book_loans.log")
-file_handler.setLevel(logging.INFO)
 
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setLevel(logging.INFO)
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    def __init__(self, filename: str, max_bytes: int, interval: float, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.interval = interval
+        self.rollover_at = time.time() + interval
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.interval > 0 and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.rollover_at = time.time() + self.interval
+
 
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
+class DeferredQueueHandler(QueueHandler):
+    # запись уходит в очередь как есть: сообщение форматируется в потоке QueueListener, а не в обработчике запроса
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+formatter = JsonFormatter()
+
+file_handler = SizeAndTimeRotatingFileHandler(settings.LOG_FILE, settings.LOG_MAX_BYTES, settings.LOG_ROTATE_INTERVAL,
+                                              settings.LOG_BACKUP_COUNT)
 file_handler.setFormatter(formatter)
+
+console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(formatter)
 
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+log_queue = SimpleQueue()
+listener = QueueListener(log_queue, file_handler, console_handler)
+listener.start()
+atexit.register(listener.stop)
+
+logger = logging.getLogger()
+logger.setLevel(settings.LOG_LEVEL)
+logger.addHandler(DeferredQueueHandler(log_queue))
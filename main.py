@@ -1,18 +1,33 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi_pagination import add_pagination
-from app.api.endpoints.authors import authors_router
-from app.api.endpoints.book import books_router
+from app.api.endpoints.admin import admin_router
+from app.api.endpoints.authors import async_authors_router, authors_router
+from app.api.endpoints.book import async_books_router, books_router
 from app.api.endpoints.bookloans import loan_router
-from app.api.endpoints.genres import genres_router
+from app.api.endpoints.genres import async_genres_router, genres_router
+from app.api.endpoints.metrics import metrics_router
 from app.api.endpoints.user import auth_router
+from app.core.config import settings
+from utils.metrics import MetricsMiddleware, QueryDebugMiddleware
 
 app = FastAPI()
+# MetricsMiddleware добавляется последним и оборачивает остальные: он заводит счетчик запросов к базе,
+# который читает QueryDebugMiddleware
+app.add_middleware(QueryDebugMiddleware)
+app.add_middleware(MetricsMiddleware)
+if settings.DB_ASYNC:
+    # async-обработчики регистрируются первыми и перекрывают синхронные маршруты с тем же путем
+    app.include_router(async_genres_router, prefix='/genres', tags=['genres'])
+    app.include_router(async_books_router, prefix='/books', tags=['books'])
+    app.include_router(async_authors_router, prefix='/authors', tags=['authors'])
 app.include_router(auth_router, tags=["auth"])
 app.include_router(genres_router, prefix='/genres', tags=['genres'])
 app.include_router(books_router, prefix='/books', tags=['books'])
 app.include_router(loan_router, prefix='/loans', tags=['loans'])
 app.include_router(authors_router, prefix='/authors', tags=['authors'])
+app.include_router(admin_router, prefix='/admin', tags=['admin'])
+app.include_router(metrics_router, tags=['metrics'])
 add_pagination(app)
 
 if __name__ == '__main__':
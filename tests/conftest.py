@@ -1,13 +1,23 @@
+from collections import Counter
+from contextlib import contextmanager
+
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import NullPool, create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from app.db.database import Base, get_db
+from app.crud.names import author_ids, genre_ids
+from app.db.database import Base, get_async_db, get_db
 from app.core.config import settings
 from main import app
+from tests.utils import count_queries
+from utils.security import decoded_tokens, verified_users
 
 SQLALCHEMY_DATABASE_URL = settings.TEST_DATABASE_URL
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# TestClient поднимает новый event loop на каждый запрос, поэтому соединения asyncpg не переиспользуются
+async_engine = create_async_engine(settings.TEST_ASYNC_DATABASE_URL, poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(autoflush=False, bind=async_engine)
 
 
 @pytest.fixture(scope='session', autouse=True)
@@ -44,4 +54,55 @@ def override_get_db(db):
         finally:
             pass
 
+    async def _get_async_db_override():
+        async with TestingAsyncSessionLocal() as async_db:
+            yield async_db
+
+    app.dependency_overrides[get_db] = _get_db_override
+    app.dependency_overrides[get_async_db] = _get_async_db_override
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """
+    Сбрасывает внутрипроцессные кэши, чтобы тесты, пишущие в базу напрямую, не видели устаревших значений.
+    """
+    author_ids.clear()
+    genre_ids.clear()
+    verified_users.clear()
+    decoded_tokens.clear()
+
+
+@pytest.fixture
+def session_per_request():
+    """
+    Выдает каждому запросу свою сессию, чтобы обработчики можно было вызывать из нескольких потоков.
+    """
+
+    def _get_db_override():
+        with TestingSessionLocal() as session:
+            yield session
+
     app.dependency_overrides[get_db] = _get_db_override
+
+
+@pytest.fixture
+def max_queries():
+    """
+    Проверяет, что внутри блока выполнено не больше limit SQL-запросов к любой базе, и выводит их при превышении.
+
+        with max_queries(3):
+            client.get('/books', headers=headers)
+    """
+
+    @contextmanager
+    def _max_queries(limit: int):
+        with count_queries() as queries:
+            yield queries
+        statements = [statement for statement, _ in queries]
+        repeated = {statement: count for statement, count in Counter(statements).items() if count > 1}
+        assert len(statements) <= limit, (
+            f'{len(statements)} queries, expected at most {limit}; repeated: {repeated}\n' + '\n'.join(statements)
+        )
+
+    return _max_queries
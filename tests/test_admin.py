@@ -0,0 +1,79 @@
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, exc, make_url
+from sqlalchemy.pool import QueuePool
+from app.core.config import settings
+from app.db.pool import PoolMetrics, instrumented_pool
+from main import app
+from tests.utils import create_test_user
+from utils.security import create_access_token
+
+client = TestClient(app)
+
+
+def test_pool_metrics_track_checkouts_and_overflow():
+    """
+    Тест счетчиков пула: выданные соединения, переполнение, таймаут ожидания.
+    """
+    metrics = PoolMetrics()
+    engine = create_engine(settings.TEST_DATABASE_URL, poolclass=instrumented_pool(QueuePool, metrics),
+                           pool_size=1, max_overflow=1, pool_timeout=0.1)
+    metrics.attach(engine)
+    first = engine.connect()
+    second = engine.connect()
+
+    stats = metrics.snapshot(engine.pool)
+    assert stats['checked_out'] == 2
+    assert stats['overflow'] == 1
+    assert stats['max_checked_out'] == 2
+
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    assert metrics.snapshot(engine.pool)['timeouts'] == 1
+    assert metrics.snapshot(engine.pool)['wait_max_ms'] >= 100
+
+    first.close()
+    second.close()
+    stats = metrics.snapshot(engine.pool)
+    assert stats['checkouts'] == 2
+    assert stats['checkins'] == 2
+    engine.dispose()
+
+
+def test_pool_metrics_ignore_connection_errors():
+    """
+    Тест на то, что ошибка подключения к базе не считается таймаутом ожидания пула.
+    """
+    metrics = PoolMetrics()
+    url = make_url(settings.TEST_DATABASE_URL).set(port=1)
+    engine = create_engine(url, poolclass=instrumented_pool(QueuePool, metrics), pool_size=1, max_overflow=0)
+    metrics.attach(engine)
+    with pytest.raises(exc.OperationalError):
+        engine.connect()
+    stats = metrics.snapshot(engine.pool)
+    assert stats['timeouts'] == 0
+    assert stats['checkouts'] == 0
+    engine.dispose()
+
+
+def test_get_pool_stats_as_admin(db):
+    """
+    Тест эндпоинта статистики пула соединений.
+    """
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.get('/admin/pool', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats['sync']['pool_size'] == settings.DB_POOL_SIZE
+    assert stats['threads']['limit'] > 0
+    assert stats['passwords'] == {'limit': settings.PASSWORD_HASH_WORKERS, 'busy': 0, 'queued': 0}
+
+
+def test_get_pool_stats_as_reader_forbidden(db):
+    """
+    Тест запрета статистики пула для читателя.
+    """
+    token = create_access_token(data={'sub': 'readeruser', 'role': 'reader'})
+    response = client.get('/admin/pool', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
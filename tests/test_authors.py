@@ -134,3 +134,62 @@ def test_delete_author_as_reader_forbidden(db):
 
     assert response.status_code == 401  # Неавторизован
     assert response.json()['detail'] == 'Access denied. Required roles: admin'
+
+
+def test_get_authors_paginated_in_sql(db):
+    """
+    Тест постраничной выдачи авторов (LIMIT/OFFSET) с упорядочиванием по id.
+    """
+    db.add_all([models.Author(name=f'Paged Author {i}') for i in range(3)])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    response = client.get('/authors', params={'page': 2, 'size': 2}, headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    page = response.json()
+    assert page['page'] == 2
+    assert page['total'] == db.query(models.Author).count()
+    ids = [author['id'] for author in page['items']]
+    assert ids == sorted(ids)
+
+
+def test_get_authors_keyset(db):
+    """
+    Тест постраничной выдачи авторов по курсору: страницы не пересекаются и покрывают всех авторов.
+    """
+    db.add_all([models.Author(name=f'Keyset Author {i}') for i in range(5)])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get('/authors', params={'cursor': cursor, 'size': 2},
+                              headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page['items']) <= 2
+        seen.extend(author['id'] for author in page['items'])
+        cursor = page['next_cursor']
+
+    assert seen == sorted(set(seen))
+    assert len(seen) == db.query(models.Author).count()
+
+
+def test_search_authors(db):
+    """
+    Тест полнотекстового поиска авторов по имени и биографии.
+    """
+    db.add_all([
+        models.Author(name='Stanislaw Lem', biography='Polish writer of science fiction'),
+        models.Author(name='Arkady Strugatsky', biography='Wrote science fiction with his brother'),
+    ])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    response = client.get('/authors', params={'search': 'lem'}, headers={'Authorization': f'Bearer {token}'})
+
+    assert response.status_code == 200
+    assert [author['name'] for author in response.json()['items']] == ['Stanislaw Lem']
@@ -1,7 +1,20 @@
+import csv
+import io
+import json
+import threading
+import time
+from datetime import date
+from types import SimpleNamespace
+
 from fastapi.testclient import TestClient
+from app.api.endpoints import book as book_endpoints
+from app.core.config import settings
+from app.crud.names import author_ids
 from app.db import models
 from main import app
-from tests.utils import create_test_user
+from tests.utils import count_queries, create_test_user
+from utils import cache
+from utils.notifications import availability
 from utils.security import create_access_token
 
 client = TestClient(app)
@@ -104,3 +117,371 @@ def test_delete_book_as_admin(db):
     deleted_book = response.json()
     assert deleted_book['title'] == 'Book to Delete'
     assert db.query(models.Book).filter(models.Book.id == book.id).first() is None
+
+
+def test_get_books_keyset(db):
+    """
+    Функция, тестирующая постраничную выдачу книг по курсору.
+    """
+    db.add_all([models.Book(title=f'Keyset Book {i}', available_copies=1) for i in range(5)])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+
+    seen = []
+    cursor = ''
+    while cursor is not None:
+        response = client.get('/books', params={'cursor': cursor, 'size': 2},
+                              headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(book['id'] for book in page['items'])
+        cursor = page['next_cursor']
+
+    assert seen == sorted(set(seen))
+    assert len(seen) == db.query(models.Book).count()
+
+
+def test_get_books_invalid_cursor(db):
+    """
+    Функция, тестирующая ответ на некорректный курсор.
+    """
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    response = client.get('/books', params={'cursor': 'not-a-cursor'}, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+
+
+def test_get_books_query_count(db):
+    """
+    Функция, проверяющая, что страница книг с жанрами и авторами читается фиксированным числом запросов.
+    """
+    genres = [models.Genre(name=f'Counted Genre {i}') for i in range(2)]
+    authors = [models.Author(name=f'Counted Author {i}') for i in range(2)]
+    db.add_all([
+        models.Book(title=f'Counted Book {i}', available_copies=1, genres=genres, authors=authors)
+        for i in range(10)
+    ])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+
+    with count_queries(db) as queries:
+        response = client.get('/books', params={'title': 'Counted Book'}, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    books = response.json()['items']
+    assert len(books) == 10
+    assert all(book['genres'] == ['Counted Genre 0', 'Counted Genre 1'] for book in books)
+    assert all(book['authors'] == ['Counted Author 0', 'Counted Author 1'] for book in books)
+    # проверка пользователя, версия каталога для ETag, подсчет total и сама страница
+    assert len(queries) <= 4
+
+
+def test_search_books_ranked(db):
+    """
+    Функция, тестирующая полнотекстовый поиск книг: совпадение в названии выше совпадения в описании.
+    """
+    db.add_all([
+        models.Book(title='Ordinary Tale', description='A story about a lighthouse keeper', available_copies=1),
+        models.Book(title='Lighthouse Keeper', description='Ordinary description', available_copies=1),
+        models.Book(title='Unrelated', description='Nothing to see', available_copies=1),
+    ])
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    response = client.get('/books', params={'search': 'lighthouse keeper'},
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    titles = [book['title'] for book in response.json()['items']]
+    assert titles == ['Lighthouse Keeper', 'Ordinary Tale']
+
+    response = client.get('/books', params={'search': 'lighthouse', 'cursor': ''},
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 400
+
+
+def test_export_books_ndjson(db):
+    """
+    Функция, тестирующая потоковую выгрузку каталога в NDJSON.
+    """
+    genre = models.Genre(name='Export Genre')
+    author = models.Author(name='Export Author')
+    db.add(models.Book(title='Export Book', available_copies=2, genres=[genre], authors=[author]))
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.get('/books/export', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    books = [json.loads(line) for line in response.text.splitlines()]
+    assert len(books) == db.query(models.Book).count()
+    exported = next(book for book in books if book['title'] == 'Export Book')
+    assert exported['genres'] == ['Export Genre']
+    assert exported['authors'] == ['Export Author']
+
+
+def test_export_books_csv(db):
+    """
+    Функция, тестирующая потоковую выгрузку каталога в CSV.
+    """
+    genres = [models.Genre(name='Csv Genre 1'), models.Genre(name='Csv Genre 2')]
+    author = models.Author(name='Csv Author')
+    db.add(models.Book(title='Csv Book', available_copies=3, genres=genres, authors=[author]))
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.get('/books/export', params={'format': 'csv'}, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == db.query(models.Book).count()
+    exported = next(row for row in rows if row['title'] == 'Csv Book')
+    assert exported.keys() == {'id', 'title', 'description', 'publication_date', 'available_copies', 'genres',
+                               'authors'}
+    assert exported['available_copies'] == '3'
+    assert exported['genres'] == 'Csv Genre 1;Csv Genre 2'
+    assert exported['authors'] == 'Csv Author'
+
+
+def test_export_books_as_reader_forbidden(db):
+    """
+    Функция, тестирующая запрет выгрузки каталога для читателя.
+    """
+    token = create_access_token(data={'sub': 'readeruser', 'role': 'reader'})
+    response = client.get('/books/export', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+
+
+def test_bulk_create_books(db):
+    """
+    Функция, тестирующая массовую загрузку книг из NDJSON с отчетом об ошибках по строкам.
+    """
+    db.add_all([models.Genre(name='Bulk Genre'), models.Author(name='Bulk Author')])
+    db.commit()
+    feed = '\n'.join([
+        json.dumps({'title': 'Bulk Book 1', 'available_copies': 1, 'genres': ['Bulk Genre'],
+                    'authors': ['Bulk Author']}),
+        json.dumps({'title': 'Bulk Book 2', 'available_copies': 1, 'genres': ['Bulk Genre'],
+                    'authors': ['Missing Author']}),
+        '',
+        '{not json',
+        json.dumps({'title': 'Bulk Book 3', 'available_copies': 4, 'genres': [], 'authors': ['Bulk Author']}),
+    ])
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.post('/books/bulk', params={'chunk_size': 2}, content=feed,
+                           headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 200
+    report = response.json()
+    assert report['created'] == 2
+    assert report['failed'] == 2
+    assert [error['line'] for error in report['errors']] == [2, 4]
+    assert report['errors'][0]['detail'] == 'Some authors do not exist'
+
+    book = db.query(models.Book).filter(models.Book.title == 'Bulk Book 1').one()
+    assert [genre.name for genre in book.genres] == ['Bulk Genre']
+    assert [author.name for author in book.authors] == ['Bulk Author']
+    assert db.query(models.Book).filter(models.Book.title == 'Bulk Book 3').one().available_copies == 4
+
+
+def test_bulk_create_books_reports_malformed_lines(db):
+    """
+    Функция, проверяющая, что строки с неверными типами, длинным названием, битой кодировкой и ошибкой базы
+    попадают в отчет, а остальные книги той же пачки сохраняются.
+    """
+    db.add(models.Author(name='Malformed Bulk Author'))
+    db.commit()
+
+    def line(title: str, copies) -> bytes:
+        return json.dumps({'title': title, 'available_copies': copies, 'genres': [],
+                           'authors': ['Malformed Bulk Author']}).encode()
+
+    feed = b'\n'.join([
+        line('Malformed Bulk 1', 1),
+        line('Malformed Bulk 2', '3'),
+        line('Malformed Bulk 3', None),
+        line('Malformed Bulk ' + 'x' * 255, 1),
+        b'{"title": "Malformed Bulk \xff"}',
+        line('Malformed Bulk 4', 2 ** 40),
+        line('Malformed Bulk 5', 'many'),
+        line('Malformed Bulk 6', 5),
+    ])
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.post('/books/bulk', params={'chunk_size': 4}, content=feed,
+                           headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/x-ndjson'})
+    assert response.status_code == 200
+    report = response.json()
+    assert report['created'] == 3
+    assert sorted(error['line'] for error in report['errors']) == [3, 4, 5, 6, 7]
+    assert 'out of range' in next(error['detail'] for error in report['errors'] if error['line'] == 6)
+
+    titles = db.query(models.Book.title).filter(models.Book.title.like('Malformed Bulk %')).order_by(models.Book.title)
+    assert [title for title, in titles] == ['Malformed Bulk 1', 'Malformed Bulk 2', 'Malformed Bulk 6']
+
+
+def test_create_book_uses_name_cache(db):
+    """
+    Функция, проверяющая, что повторное создание книги не ищет авторов и жанры в базе.
+    """
+    db.add_all([models.Genre(name='Cached Genre'), models.Author(name='Cached Author')])
+    db.commit()
+    book_data = {
+        'title': 'Cached Book',
+        'available_copies': 1,
+        'genres': ['Cached Genre'],
+        'authors': ['Cached Author'],
+    }
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    response = client.post('/books', json=book_data, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+    with count_queries(db) as queries:
+        response = client.post('/books', json=book_data, headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+    assert response.json()['authors'] == ['Cached Author']
+    assert not [statement for statement, _ in queries if statement.startswith(('SELECT authors', 'SELECT genres'))]
+
+    stats = client.get('/admin/caches', headers={'Authorization': f'Bearer {token}'}).json()
+    assert stats['author_ids']['hits'] >= 1
+    assert stats['genre_ids']['hits'] >= 1
+
+
+def test_name_cache_entries_expire(db, monkeypatch):
+    """
+    Функция, проверяющая, что запись кэша имен истекает через NAME_CACHE_TTL и имя снова ищется в базе:
+    переименование в другом процессе сюда не доходит. Время кэша подменяется, а не выжидается.
+    """
+    author = models.Author(name='Expiring Author')
+    db.add(author)
+    db.commit()
+    assert author_ids.resolve(db, ['Expiring Author']) == {'Expiring Author': [author.id]}
+    # переименование мимо API, как если бы его выполнил другой воркер
+    author.name = 'Renamed Expiring Author'
+    db.commit()
+    assert author_ids.resolve(db, ['Expiring Author']) == {'Expiring Author': [author.id]}
+
+    now = time.monotonic()
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(monotonic=lambda: now + settings.NAME_CACHE_TTL + 1))
+    assert author_ids.resolve(db, ['Expiring Author']) == {}
+
+
+def test_create_book_rejects_ambiguous_author(db):
+    """
+    Функция, проверяющая, что книга не создается, если имени автора соответствуют несколько авторов.
+    """
+    db.add_all([models.Author(name='Namesake Author'), models.Author(name='Namesake Author')])
+    db.commit()
+    book_data = {'title': 'Namesake Book', 'available_copies': 1, 'genres': [], 'authors': ['Namesake Author']}
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    for _ in range(2):
+        response = client.post('/books', json=book_data, headers=headers)
+        assert response.status_code == 400
+        assert response.json()['detail'] == 'Some authors are ambiguous'
+
+    response = client.post('/books/bulk', content=json.dumps(book_data),
+                           headers={**headers, 'Content-Type': 'application/x-ndjson'})
+    assert response.json()['errors'] == [{'line': 1, 'detail': 'Some authors are ambiguous'}]
+    assert not db.query(models.Book).filter(models.Book.title == 'Namesake Book').count()
+
+
+def test_create_book_after_author_rename(db):
+    """
+    Функция, проверяющая сброс кэша имен при переименовании автора.
+    """
+    author = models.Author(name='Renamed Author')
+    db.add(author)
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    headers = {'Authorization': f'Bearer {token}'}
+    book_data = {'title': 'Renamed Book', 'available_copies': 1, 'genres': [], 'authors': ['Renamed Author']}
+    assert client.post('/books', json=book_data, headers=headers).status_code == 200
+
+    response = client.put(f'/authors/{author.id}', json={'name': 'Author With New Name'}, headers=headers)
+    assert response.status_code == 200
+
+    assert client.post('/books', json=book_data, headers=headers).status_code == 400
+    book_data['authors'] = ['Author With New Name']
+    response = client.post('/books', json=book_data, headers=headers)
+    assert response.status_code == 200
+    assert response.json()['authors'] == ['Author With New Name']
+
+
+def test_get_books_conditional(db):
+    """
+    Функция, тестирующая ETag и ответ 304 при неизменном каталоге.
+    """
+    db.add(models.Book(title='ETag Book', available_copies=1))
+    db.commit()
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    headers = {'Authorization': f'Bearer {token}'}
+    response = client.get('/books', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['etag']
+
+    with count_queries(db) as queries:
+        response = client.get('/books', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['etag'] == etag
+    # только проверка пользователя и чтение версии каталога, без выборки книг
+    assert len(queries) <= 2
+
+    response = client.put('/authors/0', json={'name': 'Nobody'}, headers=headers)
+    assert response.status_code == 404
+    assert client.get('/books', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    response = client.post('/books', json={'title': 'ETag Book 2', 'available_copies': 1, 'genres': [],
+                                           'authors': []}, headers=headers)
+    assert response.status_code == 200
+    response = client.get('/books', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+
+
+def test_watch_availability_streams_changes(db, session_per_request, monkeypatch):
+    """
+    Функция, тестирующая SSE-поток доступности: сначала текущие остатки, затем изменение после возврата книги.
+    """
+    monkeypatch.setattr(settings, 'AVAILABILITY_STREAM_TTL', 1)
+    book = models.Book(title='Watched Book', available_copies=0)
+    db.add(book)
+    db.commit()
+    user = create_test_user(db)
+    loan = models.BookLoan(user_id=user.id, book_id=book.id, issue_date=date.today(),
+                           estimated_return_date=date.today())
+    db.add(loan)
+    db.commit()
+    book_id, loan_id = book.id, loan.id
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    # подписка оформляется до чтения остатков, поэтому возврат ждет начала потока, а не только подписки
+    streaming = threading.Event()
+    stream = book_endpoints._availability_stream
+
+    async def started_stream(subscription, snapshot):
+        streaming.set()
+        async for chunk in stream(subscription, snapshot):
+            yield chunk
+
+    monkeypatch.setattr(book_endpoints, '_availability_stream', started_stream)
+
+    def return_book():
+        assert streaming.wait(timeout=5)
+        client.post(f'loans/return/{loan_id}', headers=headers)
+
+    returner = threading.Thread(target=return_book)
+    returner.start()
+    response = client.get('/books/availability', params={'id': book_id}, headers=headers)
+    returner.join()
+
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/event-stream')
+    events = [json.loads(line.removeprefix('data: '))
+              for line in response.text.splitlines() if line.startswith('data: ')]
+    assert events == [{'book_id': book_id, 'available_copies': 0}, {'book_id': book_id, 'available_copies': 1}]
+    assert availability.stats()['subscriptions'] == 0
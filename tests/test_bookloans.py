@@ -1,14 +1,15 @@
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date, timedelta
 from fastapi.testclient import TestClient
 from app.db import models
 from main import app
-from tests.utils import create_test_user
+from tests.utils import count_queries, create_test_user
 from utils.security import create_access_token
 
 client = TestClient(app)
 
 
-def test_borrow_book_as_reader(db):
+def test_borrow_book_as_reader(db, max_queries):
     """
     Тест на возможность взять книгу в аренду как читателю.
     Проверяет, что пользователь может взять книгу, если у него нет
@@ -31,10 +32,13 @@ def test_borrow_book_as_reader(db):
 
     user = create_test_user(db)
 
+    book_id = book.id
     token = create_access_token(data={'sub': user.username, 'role': 'reader'})
-    response = client.post(f'loans/borrow/{book.id}', headers={'Authorization': f'Bearer {token}'})
+    # пользователь, лимит выдач, остаток копий, новая выдача, версия каталога
+    with max_queries(5):
+        response = client.post(f'loans/borrow/{book_id}', headers={'Authorization': f'Bearer {token}'})
     assert response.status_code == 200
-    assert response.json()['book_id'] == book.id
+    assert response.json()['book_id'] == book_id
 
 
 def test_borrow_book_max_books(db):
@@ -73,6 +77,26 @@ def test_borrow_book_max_books(db):
     assert response.json()['detail'] == "You can't borrow more than 5 books at the same time."
 
 
+def test_borrow_book_ignores_returned_loans(db):
+    """
+    Тест на то, что возвращенные книги не учитываются в лимите из 5 книг.
+    """
+    book = models.Book(title='Reread Book', available_copies=1)
+    db.add(book)
+    db.commit()
+    user = create_test_user(db)
+    db.add_all([
+        models.BookLoan(user_id=user.id, book_id=book.id, issue_date=date.today(),
+                        estimated_return_date=date.today(), actual_return_date=date.today())
+        for _ in range(5)
+    ])
+    db.commit()
+
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    response = client.post(f'loans/borrow/{book.id}', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 200
+
+
 def test_return_book_as_reader(db):
     """
     Тест на возврат книги как читателем.
@@ -168,8 +192,108 @@ def test_get_my_loans(db):
     token = create_access_token(data={'sub': user.username, 'role': 'reader'})
     response = client.get('loans/my', headers={'Authorization': f'Bearer {token}'})
     assert response.status_code == 200
-    assert len(response.json()) == 1
-    assert response.json()[0]['book_id'] == book.id
+    assert len(response.json()['items']) == 1
+    assert response.json()['items'][0]['book_id'] == book.id
+
+
+def test_get_my_loans_filtered_and_paged(db):
+    """
+    Тест на фильтрацию арендованных книг по статусу и постраничную выдачу.
+    Проверяет, что активные и возвращенные выдачи разделяются, а курсор обходит все выдачи без повторов.
+    """
+    book = models.Book(title='Paged Loans Book', available_copies=3)
+    db.add(book)
+    db.commit()
+    user = create_test_user(db)
+    db.add_all([
+        models.BookLoan(user_id=user.id, book_id=book.id, issue_date=date.today(), estimated_return_date=date.today(),
+                        actual_return_date=date.today() if i % 2 else None)
+        for i in range(5)
+    ])
+    db.commit()
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    active = client.get('loans/my', params={'status': 'active'}, headers=headers).json()['items']
+    returned = client.get('loans/my', params={'status': 'returned'}, headers=headers).json()['items']
+    assert len(active) == 3 and all(loan['actual_return_date'] is None for loan in active)
+    assert len(returned) == 2 and all(loan['actual_return_date'] is not None for loan in returned)
+
+    first = client.get('loans/my', params={'size': 3}, headers=headers).json()
+    second = client.get('loans/my', params={'size': 3, 'cursor': first['next_cursor']}, headers=headers).json()
+    assert second['next_cursor'] is None
+    assert sorted(loan['loan_id'] for loan in first['items'] + second['items']) == \
+        sorted(loan['loan_id'] for loan in active + returned)
+
+    assert client.get('loans/my', params={'status': 'lost'}, headers=headers).status_code == 422
+
+
+def test_batch_borrow_and_return(db):
+    """
+    Тест пакетной выдачи и возврата книг.
+    Проверяет результат по каждой позиции и то, что остатки меняются одним набором запросов.
+    """
+    available = models.Book(title='Batch Book', available_copies=2)
+    sold_out = models.Book(title='Batch Sold Out', available_copies=0)
+    db.add_all([available, sold_out])
+    db.commit()
+    user = create_test_user(db)
+    user_id = user.id
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    book_ids = [available.id, sold_out.id, 999999, available.id]
+    with count_queries(db) as queries:
+        response = client.post('loans/borrow', json={'book_ids': book_ids}, headers=headers)
+    assert response.status_code == 200
+    results = response.json()
+    assert [result['status_code'] for result in results] == [200, 400, 404, 400]
+    assert results[0]['loan']['user_id'] == user_id
+    assert results[1]['detail'] == 'No available copies of the book.'
+    assert len([statement for statement, _ in queries if statement.startswith('UPDATE books')]) == 1
+
+    loan_id = results[0]['loan']['loan_id']
+    response = client.post('loans/return', json={'loan_ids': [loan_id, 999999]}, headers=headers)
+    assert [result['status_code'] for result in response.json()] == [200, 404]
+    response = client.post('loans/return', json={'loan_ids': [loan_id]}, headers=headers)
+    assert response.json()[0]['detail'] == 'You already returned this book'
+    db.refresh(available)
+    assert available.available_copies == 2
+
+
+def test_batch_borrow_respects_limit(db):
+    """
+    Тест на то, что пакетная выдача учитывает лимит из 5 книг.
+    """
+    books = [models.Book(title=f'Limit Book {i}', available_copies=1) for i in range(6)]
+    db.add_all(books)
+    db.commit()
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    response = client.post('loans/borrow', json={'book_ids': [book.id for book in books]}, headers=headers)
+    assert [result['status_code'] for result in response.json()] == [200] * 5 + [400]
+    assert response.json()[5]['detail'] == "You can't borrow more than 5 books at the same time."
+
+
+def test_batch_borrow_limit_counts_only_taken_books(db):
+    """
+    Тест на то, что отсутствующие и разобранные книги не расходуют лимит пакетной выдачи.
+    Проверяет, что доступные книги после них выдаются, а ошибку лимита получают только доступные книги сверх него.
+    """
+    sold_out = models.Book(title='Limit Sold Out', available_copies=0)
+    books = [models.Book(title=f'Limit Mixed Book {i}', available_copies=1) for i in range(6)]
+    db.add_all([sold_out, *books])
+    db.commit()
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    book_ids = [999991, 999992, 999993, 999994, 999995, sold_out.id, *(book.id for book in books)]
+    response = client.post('loans/borrow', json={'book_ids': book_ids}, headers=headers)
+    results = response.json()
+    assert [result['status_code'] for result in results] == [404] * 5 + [400] + [200] * 5 + [400]
+    assert results[5]['detail'] == 'No available copies of the book.'
+    assert results[-1]['detail'] == "You can't borrow more than 5 books at the same time."
+    db.refresh(books[-1])
+    assert books[-1].available_copies == 1
 
 
 def test_remove_loan_as_admin(db):
@@ -206,3 +330,85 @@ def test_remove_loan_as_admin(db):
     assert response.status_code == 200
     assert response.json()['loan_id'] == loan.id
     assert db.query(models.BookLoan).filter(models.BookLoan.id == loan.id).first() is None
+
+
+def test_loans_use_token_principal(db):
+    """
+    Тест на то, что операции с арендой берут id пользователя из токена.
+    Проверяет, что пользователь ищется в базе только при первой проверке токена.
+    """
+    book = models.Book(title='Principal Book', available_copies=1)
+    db.add(book)
+    db.commit()
+    user = create_test_user(db)
+    user_id = user.id
+    token = create_access_token(data={'sub': user.username, 'uid': user_id, 'role': 'reader'})
+    headers = {'Authorization': f'Bearer {token}'}
+
+    with count_queries(db) as queries:
+        response = client.post(f'loans/borrow/{book.id}', headers=headers)
+        assert response.status_code == 200
+        loan_id = response.json()['loan_id']
+        assert client.post(f'loans/return/{loan_id}', headers=headers).status_code == 200
+        assert client.get('loans/my', headers=headers).json()['items'][0]['user_id'] == user_id
+    assert len([statement for statement, _ in queries if 'FROM users' in statement]) == 1
+
+
+def test_concurrent_borrow_does_not_oversell(db, session_per_request):
+    """
+    Стресс-тест параллельной выдачи одной книги.
+    Проверяет, что копий выдается ровно столько, сколько было в наличии.
+    """
+    book = models.Book(title='Popular Book', available_copies=5)
+    db.add(book)
+    db.commit()
+    users = [create_test_user(db) for _ in range(20)]
+    tokens = [create_access_token(data={'sub': user.username, 'uid': user.id, 'role': 'reader'}) for user in users]
+    headers = [{'Authorization': f'Bearer {token}'} for token in tokens]
+
+    with ThreadPoolExecutor(max_workers=len(headers)) as executor:
+        responses = list(executor.map(lambda user_headers: client.post(f'loans/borrow/{book.id}',
+                                                                       headers=user_headers), headers))
+
+    assert sorted(response.status_code for response in responses) == [200] * 5 + [400] * 15
+    db.refresh(book)
+    assert book.available_copies == 0
+    assert db.query(models.BookLoan).filter(models.BookLoan.book_id == book.id).count() == 5
+
+
+def test_get_overdue_loans_as_admin(db):
+    """
+    Тест отчета о просроченных выдачах.
+    Проверяет, что в отчет попадают только невозвращенные книги с истекшим сроком, с именем читателя и названием книги.
+    """
+    book = models.Book(title='Overdue Book', available_copies=0)
+    db.add(book)
+    db.commit()
+    user = create_test_user(db)
+    overdue_date = date.today() - timedelta(days=1)
+    db.add_all([
+        models.BookLoan(user_id=user.id, book_id=book.id, issue_date=overdue_date, estimated_return_date=overdue_date),
+        models.BookLoan(user_id=user.id, book_id=book.id, issue_date=overdue_date, estimated_return_date=overdue_date,
+                        actual_return_date=date.today()),
+        models.BookLoan(user_id=user.id, book_id=book.id, issue_date=date.today(), estimated_return_date=date.today()),
+    ])
+    db.commit()
+
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    loans, cursor = [], None
+    while True:
+        params = {'size': 2, **({'cursor': cursor} if cursor else {})}
+        response = client.get('loans/overdue', params=params, headers={'Authorization': f'Bearer {token}'})
+        assert response.status_code == 200
+        loans += response.json()['items']
+        cursor = response.json()['next_cursor']
+        if not cursor:
+            break
+
+    assert len({loan['loan_id'] for loan in loans}) == len(loans)
+    assert all(loan['actual_return_date'] is None and loan['estimated_return_date'] < date.today().isoformat()
+               for loan in loans)
+    mine = [loan for loan in loans if loan['user_id'] == user.id]
+    assert len(mine) == 1
+    assert mine[0]['username'] == user.username
+    assert mine[0]['book_title'] == 'Overdue Book'
@@ -0,0 +1,77 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from fastapi_pagination import add_pagination
+from app.api.endpoints.authors import async_authors_router
+from app.api.endpoints.book import async_books_router
+from app.api.endpoints.genres import async_genres_router
+from app.db import models
+from main import app
+from tests.utils import create_test_user
+from utils.security import create_access_token
+
+async_app = FastAPI()
+async_app.include_router(async_genres_router, prefix='/genres')
+async_app.include_router(async_books_router, prefix='/books')
+async_app.include_router(async_authors_router, prefix='/authors')
+add_pagination(async_app)
+# общие подмены зависимостей заполняются фикстурой override_get_db из conftest
+async_app.dependency_overrides = app.dependency_overrides
+
+client = TestClient(async_app)
+
+
+def test_get_books_async(db):
+    """
+    Тест async-версии списка книг: страница, курсор и ETag.
+    """
+    genre = models.Genre(name='Async Genre')
+    author = models.Author(name='Async Author')
+    db.add_all([
+        models.Book(title=f'Async Book {i}', available_copies=1, genres=[genre], authors=[author]) for i in range(3)
+    ])
+    db.commit()
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    response = client.get('/books', params={'title': 'Async Book'}, headers=headers)
+    assert response.status_code == 200
+    page = response.json()
+    assert page['total'] == 3
+    assert page['items'][0]['genres'] == ['Async Genre']
+    assert page['items'][0]['authors'] == ['Async Author']
+
+    response = client.get('/books', params={'title': 'Async Book', 'cursor': '', 'size': 2}, headers=headers)
+    assert response.status_code == 200
+    assert len(response.json()['items']) == 2
+    assert response.json()['next_cursor'] is not None
+
+    etag = client.get('/books', headers=headers).headers['etag']
+    assert client.get('/books', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+
+def test_get_authors_async(db):
+    """
+    Тест async-версии списка авторов.
+    """
+    db.add(models.Author(name='Async Only Author', biography='Writes asynchronously'))
+    db.commit()
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'reader'})}"}
+
+    response = client.get('/authors', params={'search': 'asynchronously'}, headers=headers)
+    assert response.status_code == 200
+    assert [author['name'] for author in response.json()['items']] == ['Async Only Author']
+
+
+def test_get_genres_async_requires_existing_user(db):
+    """
+    Тест async-проверки роли и существования пользователя.
+    """
+    token = create_access_token(data={'sub': 'ghost', 'role': 'admin'})
+    response = client.get('/genres', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+    assert response.json()['detail'] == 'User ghost does not exist'
+
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    assert client.get('/genres', headers={'Authorization': f'Bearer {token}'}).status_code == 200
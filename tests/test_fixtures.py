@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import text
+from app.crud.loan import MAX_ACTIVE_LOANS
+from app.db.fixtures import fill_database
+from tests.conftest import engine
+
+COUNTS = {'genres': 40, 'authors': 100, 'books': 500, 'users': 200, 'loans': 5000}
+TODAY = date(2025, 3, 1)
+
+
+@contextmanager
+def generated(seed: int):
+    connection = engine.connect()
+    transaction = connection.begin()
+    try:
+        yield connection, fill_database(connection, **COUNTS, seed=seed, today=TODAY)
+    finally:
+        transaction.rollback()
+        connection.close()
+
+
+def _snapshot(connection, first: dict[str, int]) -> dict[str, list]:
+    queries = {
+        'books': 'SELECT id, title, available_copies FROM books WHERE id >= :books ORDER BY id',
+        'books_genres': 'SELECT book_id, genre_id FROM books_genres WHERE book_id >= :books ORDER BY 1, 2',
+        'book_loans': 'SELECT id, user_id, book_id, issue_date, actual_return_date FROM book_loans '
+                      'WHERE id >= :book_loans ORDER BY id',
+    }
+    return {name: connection.execute(text(query), first).all() for name, query in queries.items()}
+
+
+def test_fill_database_is_deterministic():
+    """
+    Тест генератора данных: один и тот же seed дает те же строки, другой seed - другие.
+    """
+    with generated(seed=1) as (connection, first):
+        expected = _snapshot(connection, first)
+    with generated(seed=1) as (connection, first):
+        assert _snapshot(connection, first) == expected
+    with generated(seed=2) as (connection, first):
+        assert _snapshot(connection, first) != expected
+
+
+def test_fill_database_keeps_loans_consistent():
+    """
+    Тест генератора данных: заданные объемы загружены, остаток копий не уходит в минус,
+    у читателя на руках не больше лимита, а выдачи сосредоточены на популярных книгах.
+    """
+    with generated(seed=3) as (connection, first):
+        tables = {'genres': 'genres', 'authors': 'authors', 'books': 'books', 'users': 'users', 'loans': 'book_loans'}
+        # админ создается, только если его еще нет, поэтому считаются одни читатели
+        counts = {name: connection.scalar(text(f"SELECT count(*) FROM {table} WHERE id >= :first"
+                                               f"{' AND role = :role' if table == 'users' else ''}"),
+                                          {'first': first[table], 'role': 'READER'})
+                  for name, table in tables.items()}
+        assert counts == COUNTS
+
+        assert not connection.scalar(text('SELECT count(*) FROM books WHERE id >= :books AND available_copies < 0'),
+                                     first)
+        most_active = connection.scalar(text(
+            'SELECT max(loans) FROM (SELECT count(*) AS loans FROM book_loans '
+            'WHERE id >= :book_loans AND actual_return_date IS NULL GROUP BY user_id) AS active'
+        ), first)
+        assert 0 < most_active <= MAX_ACTIVE_LOANS
+
+        top_books = connection.scalar(text(
+            'SELECT sum(loans) FROM (SELECT count(*) AS loans FROM book_loans WHERE id >= :book_loans '
+            'GROUP BY book_id ORDER BY loans DESC LIMIT 50) AS top'
+        ), first)
+        assert top_books > COUNTS['loans'] / 4
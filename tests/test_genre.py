@@ -126,3 +126,21 @@ def test_delete_non_existent_genre(db):
 
     assert response.status_code == 404
     assert response.json()['detail'] == 'Genre not found'
+
+
+def test_get_genres_etag_changes_on_write(db):
+    """
+    Функция тестирующая смену ETag списка жанров после создания жанра.
+    """
+    db.add(models.Genre(name='Conditional'))
+    db.commit()
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'admin'})}"}
+
+    etag = client.get('/genres', headers=headers).headers['etag']
+    assert client.get('/genres', headers={**headers, 'If-None-Match': etag}).status_code == 304
+
+    assert client.post('/genres', json={'name': 'Conditional 2'}, headers=headers).status_code == 200
+    response = client.get('/genres', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert len(response.json()) == db.query(models.Genre).count()
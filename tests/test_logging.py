@@ -0,0 +1,35 @@
+import json
+import logging
+
+from logging_config import JsonFormatter, SizeAndTimeRotatingFileHandler
+
+
+def test_json_formatter_includes_extra_fields():
+    """
+    Тест JSON-формата логов: сообщение собирается из аргументов, поля из extra выводятся отдельно.
+    """
+    record = logging.makeLogRecord({'name': 'loans', 'levelno': logging.INFO, 'levelname': 'INFO',
+                                    'msg': 'User %s borrowed book %s', 'args': ('reader', 7), 'book_id': 7})
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry['message'] == 'User reader borrowed book 7'
+    assert entry['level'] == 'INFO'
+    assert entry['book_id'] == 7
+
+
+def test_rotating_handler_rolls_over_by_size_and_time(tmp_path):
+    """
+    Тест ротации файла логов: по превышению размера и по истечении интервала.
+    """
+    path = tmp_path / 'loans.log'
+    handler = SizeAndTimeRotatingFileHandler(str(path), max_bytes=50, interval=3600, backup_count=2)
+    handler.setFormatter(JsonFormatter())
+    record = logging.makeLogRecord({'msg': 'x' * 40})
+    handler.handle(record)
+    handler.handle(record)
+    assert (tmp_path / 'loans.log.1').exists()
+
+    handler.maxBytes = 0
+    handler.rollover_at = 0
+    handler.handle(record)
+    assert (tmp_path / 'loans.log.2').exists()
+    handler.close()
@@ -0,0 +1,105 @@
+import re
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.core.config import settings
+from main import app
+from tests.conftest import engine
+from tests.utils import create_test_user
+from utils.metrics import Histogram, MetricsMiddleware, QueryDebugMiddleware, RequestMetrics
+from utils.security import create_access_token
+
+client = TestClient(app)
+
+
+def _sample(text: str, name: str, **labels: str) -> float:
+    label_text = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    series = f'{name}{{{label_text}}}' if labels else name
+    match = re.search(rf'^{re.escape(series)} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_histogram_bucket_counts():
+    """
+    Тест ячеек гистограммы: граница включается в ячейку, значения выше последней границы попадают в +Inf.
+    """
+    histogram = Histogram((0.01, 0.1, 1.0))
+    for value in (0.001, 0.01, 0.05, 0.5, 20):
+        histogram.observe(value)
+    assert histogram.cumulative() == [('0.01', 2), ('0.1', 3), ('1.0', 4), ('+Inf', 5)]
+    assert histogram.count == 5
+    assert histogram.sum == 20.561
+
+
+def test_metrics_endpoint_counts_requests_by_route(db):
+    """
+    Тест эндпоинта /metrics: счетчики по шаблону маршрута и статусу, гистограммы времени запроса и работы с базой.
+    """
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'admin'})}"}
+    before = client.get('/metrics').text
+
+    for _ in range(3):
+        client.get('/genres', headers=headers)
+    client.put('/books/0', json={'title': 'Nothing'}, headers=headers)
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.headers['content-type'].startswith('text/plain')
+    after = response.text
+
+    def delta(name, **labels):
+        return _sample(after, name, **labels) - _sample(before, name, **labels)
+
+    genres = {'method': 'GET', 'route': '/genres'}
+    assert delta('http_requests_total', **genres, status='200') == 3
+    assert delta('http_request_duration_seconds_count', **genres) == 3
+    assert delta('http_request_duration_seconds_bucket', **genres, le='+Inf') == 3
+    assert delta('http_request_db_seconds_count', **genres) == 3
+    assert delta('http_request_db_seconds_sum', **genres) > 0
+    assert delta('http_requests_total', method='PUT', route='/books/{book_id}', status='404') == 1
+    assert _sample(after, 'http_requests_in_flight') == 1
+
+
+def test_metrics_token_required_when_configured(monkeypatch):
+    """
+    Тест защиты /metrics токеном, если он задан в настройках.
+    """
+    monkeypatch.setattr(settings, 'METRICS_TOKEN', 'scrape-secret')
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer scrape-secret'}).status_code == 200
+
+
+def test_debug_headers_report_queries(db, monkeypatch):
+    """
+    Тест заголовков X-DB-Queries и X-DB-Time в режиме отладки.
+    """
+    user = create_test_user(db)
+    headers = {'Authorization': f"Bearer {create_access_token(data={'sub': user.username, 'role': 'admin'})}"}
+    assert 'X-DB-Queries' not in client.get('/genres', headers=headers).headers
+
+    monkeypatch.setattr(settings, 'DEBUG', True)
+    response = client.get('/genres', headers=headers)
+    assert int(response.headers['X-DB-Queries']) >= 1
+    assert float(response.headers['X-DB-Time']) > 0
+    assert 'X-DB-Repeated' not in response.headers
+
+
+def test_debug_flags_repeated_statements(monkeypatch):
+    """
+    Тест обнаружения N+1: один и тот же запрос, выполненный много раз за запрос, помечается заголовком.
+    """
+    monkeypatch.setattr(settings, 'DEBUG', True)
+    n_plus_one_app = FastAPI()
+    n_plus_one_app.add_middleware(QueryDebugMiddleware)
+    n_plus_one_app.add_middleware(MetricsMiddleware, metrics=RequestMetrics())
+
+    @n_plus_one_app.get('/items')
+    def get_items():
+        with engine.connect() as connection:
+            return [connection.execute(text('SELECT :item_id'), {'item_id': item_id}).scalar()
+                    for item_id in range(settings.REPEATED_QUERY_THRESHOLD)]
+
+    response = TestClient(n_plus_one_app).get('/items')
+    assert response.headers['X-DB-Queries'] == str(settings.REPEATED_QUERY_THRESHOLD)
+    assert response.headers['X-DB-Repeated'] == '1'
@@ -0,0 +1,92 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.orm import Session
+from app.crud.book import get_book_out
+from app.crud.loan import (close_loan, count_active_loans, loans_out, overdue_loans_out, select_overdue_loans,
+                           select_user_loans)
+from app.db import models
+from tests.conftest import engine
+from tests.utils import count_queries, explain
+from utils.pagination import paginate_keyset
+
+
+def _numbered(table: str, column: str, prefix: str) -> str:
+    return f"(SELECT id, row_number() OVER (ORDER BY id) AS n FROM {table} WHERE {column} LIKE '{prefix} %')"
+
+
+SEED = [
+    "INSERT INTO users (username, email, hashed_password, role) "
+    "SELECT 'plan_user ' || i, 'plan_user_' || i || '@example.com', '-', 'READER' FROM generate_series(1, 2000) i",
+    "INSERT INTO books (title, available_copies) SELECT 'Plan Book ' || i, 3 FROM generate_series(1, 10000) i",
+    "INSERT INTO authors (name) SELECT 'Plan Author ' || i FROM generate_series(1, 2000) i",
+    "INSERT INTO genres (name) SELECT 'Plan Genre ' || i FROM generate_series(1, 1000) i",
+    "INSERT INTO books_authors (book_id, author_id) SELECT b.id, a.id "
+    f"FROM {_numbered('books', 'title', 'Plan Book')} b "
+    f"JOIN {_numbered('authors', 'name', 'Plan Author')} a ON a.n = b.n % 2000 + 1",
+    "INSERT INTO books_genres (book_id, genre_id) SELECT b.id, g.id "
+    f"FROM {_numbered('books', 'title', 'Plan Book')} b "
+    f"JOIN {_numbered('genres', 'name', 'Plan Genre')} g ON g.n = b.n % 1000 + 1",
+    "INSERT INTO book_loans (user_id, book_id, issue_date, estimated_return_date, actual_return_date) "
+    "SELECT u.id, b.id, current_date - 1000 + i % 1000, current_date - 986 + i % 1000, "
+    "CASE WHEN i % 50 = 0 THEN NULL ELSE current_date END FROM generate_series(1, 50000) i "
+    f"JOIN {_numbered('users', 'username', 'plan_user')} u ON u.n = i % 2000 + 1 "
+    f"JOIN {_numbered('books', 'title', 'Plan Book')} b ON b.n = i % 10000 + 1",
+]
+
+
+@pytest.fixture(scope='module')
+def seeded():
+    """
+    Наполняет таблицы в транзакции, которая откатывается после тестов модуля, и обновляет статистику планировщика.
+    """
+    connection = engine.connect()
+    transaction = connection.begin()
+    for statement in SEED:
+        connection.execute(text(statement))
+    connection.execute(text('ANALYZE users, books, authors, genres, books_authors, books_genres, book_loans'))
+    session = Session(bind=connection)
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+
+def _last_id(db: Session, model) -> int:
+    return db.scalar(select(model.id).order_by(model.id.desc()).limit(1))
+
+
+QUERIES = {
+    'active_loans_count': lambda db: count_active_loans(db, _last_id(db, models.User)),
+    'my_loans': lambda db: paginate_keyset(db, select_user_loans(_last_id(db, models.User)), models.BookLoan.id, None,
+                                           50, loans_out),
+    'my_active_loans': lambda db: paginate_keyset(db, select_user_loans(_last_id(db, models.User), 'active'),
+                                                  models.BookLoan.id, None, 50, loans_out),
+    'return_loan': lambda db: close_loan(db, _last_id(db, models.BookLoan), _last_id(db, models.User)),
+    'book_loans': lambda db: db.execute(
+        select(models.BookLoan.id).where(models.BookLoan.book_id == _last_id(db, models.Book))).all(),
+    'book_projection': lambda db: get_book_out(db, _last_id(db, models.Book)),
+    'genre_books': lambda db: db.execute(
+        select(models.books_genres.c.book_id)
+        .where(models.books_genres.c.genre_id == _last_id(db, models.Genre))).all(),
+    'due_loans': lambda db: db.execute(
+        select(models.BookLoan.id).where(models.BookLoan.estimated_return_date == date.today())).all(),
+    'overdue_loans': lambda db: paginate_keyset(db, select_overdue_loans(), models.BookLoan.id, None, 50,
+                                                overdue_loans_out),
+}
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_hot_queries_use_indexes(seeded, name):
+    """
+    Тест планов запросов: ни один из частых запросов не должен читать таблицу целиком.
+    """
+    with count_queries(seeded) as queries:
+        QUERIES[name](seeded)
+
+    for statement, parameters in queries:
+        plan = explain(seeded, statement, parameters)
+        assert 'Seq Scan' not in plan, f'{name}:\n{statement}\n{plan}'
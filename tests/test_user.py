@@ -1,5 +1,15 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from passlib.context import CryptContext
 from fastapi.testclient import TestClient
+from app.db import models
 from main import app
+from tests.utils import count_queries, create_test_user
+from utils import cache
+from utils.security import create_access_token, decoded_tokens, pwd_context, verified_users, verify_token
 
 client = TestClient(app)
 
@@ -22,8 +32,121 @@ def test_register_and_login(db):
     assert response.status_code == 200
     assert 'access_token' in response.json()
     assert response.json()['token_type'] == 'bearer'
+    user = db.query(models.User).filter(models.User.username == 'testuser').first()
+    assert verify_token(response.json()['access_token'])['uid'] == user.id
 
     login_data_invalid = {'username': 'testuser', 'password': 'wrongpassword'}
     response = client.post('/login', json=login_data_invalid)
     assert response.status_code == 401
     assert response.json()['detail'] == 'Invalid username or password'
+
+
+def test_role_verify_caches_existing_user(db):
+    """
+    Функция, проверяющая, что повторный запрос не проверяет пользователя в базе, а удаление сбрасывает кэш.
+    """
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'admin'})
+    headers = {'Authorization': f'Bearer {token}'}
+    assert client.get('/admin/caches', headers=headers).status_code == 200
+
+    with count_queries(db) as queries:
+        assert client.get('/admin/caches', headers=headers).status_code == 200
+    assert not queries
+
+    db.delete(user)
+    db.commit()
+    response = client.get('/admin/caches', headers=headers)
+    assert response.status_code == 401
+    assert response.json()['detail'] == f'User {user.username} does not exist'
+
+
+def test_role_change_invalidates_cached_user(db):
+    """
+    Функция, проверяющая сброс кэша пользователя при смене роли.
+    """
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'role': 'reader'})
+    assert client.get('/loans/my', headers={'Authorization': f'Bearer {token}'}).json()['items'] == []
+    assert verified_users.get(user.username)
+
+    user.role = models.Role.ADMIN
+    db.commit()
+    assert verified_users.get(user.username) is None
+
+
+def test_verify_token_memoized_until_expiry(monkeypatch):
+    """
+    Функция, проверяющая, что расшифрованный токен берется из кэша до exp, а после exp проверяется заново
+    и просроченный токен отклоняется. Время кэша подменяется, а не выжидается.
+    """
+    token = create_access_token(data={'sub': 'cached', 'role': 'reader'}, token_life_time=1)
+    hits, misses = decoded_tokens.hits, decoded_tokens.misses
+    assert verify_token(token)['sub'] == 'cached'
+    assert verify_token(token)['sub'] == 'cached'
+    assert (decoded_tokens.hits, decoded_tokens.misses) == (hits + 1, misses + 1)
+
+    now = time.monotonic()
+    monkeypatch.setattr(cache, 'time', SimpleNamespace(monotonic=lambda: now + 61))
+    assert verify_token(token)['sub'] == 'cached'
+    assert (decoded_tokens.hits, decoded_tokens.misses) == (hits + 1, misses + 2)
+
+    expired = create_access_token(data={'sub': 'cached', 'role': 'reader'}, token_life_time=-1)
+    with pytest.raises(HTTPException) as e:
+        verify_token(expired)
+    assert e.value.detail == 'Expired token'
+
+
+def test_verify_token_rejects_invalid_token():
+    """
+    Функция, проверяющая, что некорректный токен не попадает в кэш.
+    """
+    for _ in range(2):
+        with pytest.raises(HTTPException) as e:
+            verify_token('not-a-token')
+        assert e.value.detail == 'Invalid token'
+    assert decoded_tokens.stats()['size'] == 0
+
+
+def test_role_verify_rejects_foreign_uid(db):
+    """
+    Функция, проверяющая, что токен с чужим id пользователя отклоняется.
+    """
+    user = create_test_user(db)
+    token = create_access_token(data={'sub': user.username, 'uid': user.id + 1, 'role': 'admin'})
+    response = client.get('/admin/caches', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+    assert response.json()['detail'] == 'Invalid token'
+
+
+def test_change_user_info_for_deleted_user(db):
+    """
+    Функция, проверяющая, что удаленный пользователь с еще действующим токеном получает 401, а не ошибку сервера.
+    """
+    user = create_test_user(db)
+    username, user_id = user.username, user.id
+    token = create_access_token(data={'sub': username, 'uid': user_id, 'role': 'reader'})
+    db.delete(user)
+    db.commit()
+    # запись кэша, которую другой воркер еще не сбросил
+    verified_users.put(username, user_id)
+
+    response = client.put('/me', json={'email': 'deleted_user@example.com'},
+                          headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+    assert response.json()['detail'] == f'User {username} does not exist'
+
+
+def test_login_rehashes_password_with_configured_rounds(db):
+    """
+    Функция, проверяющая, что пароль с устаревшим числом раундов bcrypt перехэшируется при логине.
+    """
+    user = create_test_user(db)
+    user.hashed_password = CryptContext(schemes=['bcrypt'], bcrypt__rounds=4).hash('oldpassword')
+    db.commit()
+
+    response = client.post('/login', json={'username': user.username, 'password': 'oldpassword'})
+    assert response.status_code == 200
+    db.refresh(user)
+    assert not pwd_context.needs_update(user.hashed_password)
+    assert pwd_context.verify('oldpassword', user.hashed_password)
@@ -1,4 +1,7 @@
 import uuid
+from contextlib import contextmanager
+
+from sqlalchemy import Engine, event
 
 from app.db import models
 
@@ -12,4 +15,25 @@ def create_test_user(db):
     )
     db.add(user)
     db.commit()
-    return user
\ No newline at end of file
+    return user
+
+
+@contextmanager
+def count_queries(db=None):
+    # без сессии слушаются все движки, в том числе sync_engine асинхронного
+    queries = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    engine = Engine if db is None else db.get_bind()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield queries
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def explain(db, statement, parameters=None):
+    rows = db.connection().exec_driver_sql(f'EXPLAIN {statement}', parameters or {}).all()
+    return '\n'.join(row[0] for row in rows)
@@ -0,0 +1,35 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from starlette import status
+from app.crud.versions import current_versions, current_versions_async
+from app.db.database import get_async_db, get_db
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {candidate.strip().removeprefix('W/') for candidate in if_none_match.split(',')}
+    return '*' in candidates or etag in candidates
+
+
+class CatalogETag:
+    def __init__(self, *tables: str):
+        self.tables = tables
+
+    def check(self, request: Request, response: Response, versions: tuple[int, ...]) -> str:
+        etag = '"' + '-'.join(f'{table}.{version}' for table, version in zip(self.tables, versions)) + '"'
+        if etag_matches(request.headers.get('if-none-match'), etag):
+            raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        response.headers['ETag'] = etag
+        return etag
+
+    def __call__(self, request: Request, response: Response, db: Session = Depends(get_db)) -> str:
+        return self.check(request, response, current_versions(db, *self.tables))
+
+
+class AsyncCatalogETag(CatalogETag):
+    async def __call__(self, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)) -> str:
+        return self.check(request, response, await current_versions_async(db, *self.tables))
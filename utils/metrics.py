@@ -0,0 +1,163 @@
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from itertools import accumulate
+from threading import Lock
+from typing import Iterable
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.db.queries import QueryStats, current_query_stats
+from logging_config import logger
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # верхние границы включительно, как le в Prometheus; последняя ячейка - +Inf
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        bounds = [repr(bound) for bound in self.buckets] + ['+Inf']
+        return list(zip(bounds, accumulate(self.counts)))
+
+
+def _labels(**labels: str) -> str:
+    pairs = ','.join(f'{key}="{value}"' for key, value in labels.items())
+    return f'{{{pairs}}}' if pairs else ''
+
+
+def _histogram_lines(name: str, histograms: dict[tuple[str, str], Histogram]) -> list[str]:
+    lines = []
+    for (method, route), histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            lines.append(f'{name}_bucket{_labels(method=method, route=route, le=bound)} {count}')
+        lines.append(f'{name}_sum{_labels(method=method, route=route)} {histogram.sum}')
+        lines.append(f'{name}_count{_labels(method=method, route=route)} {histogram.count}')
+    return lines
+
+
+class RequestMetrics:
+    def __init__(self, buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.requests: dict[tuple[str, str, int], int] = defaultdict(int)
+        self.latency: dict[tuple[str, str], Histogram] = {}
+        self.db_time: dict[tuple[str, str], Histogram] = {}
+        self.in_flight = 0
+        self._lock = Lock()
+
+    def started(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finished(self, method: str, route: str, status_code: int, duration: float, db_duration: float) -> None:
+        key = (method, route)
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[(method, route, status_code)] += 1
+            if key not in self.latency:
+                self.latency[key] = Histogram(self.buckets)
+                self.db_time[key] = Histogram(self.buckets)
+            self.latency[key].observe(duration)
+            self.db_time[key].observe(db_duration)
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                '# HELP http_requests_total Total HTTP requests by route and status code.',
+                '# TYPE http_requests_total counter',
+                *(f'http_requests_total{_labels(method=method, route=route, status=status_code)} {count}'
+                  for (method, route, status_code), count in sorted(self.requests.items())),
+                '# HELP http_requests_in_flight HTTP requests currently being served.',
+                '# TYPE http_requests_in_flight gauge',
+                f'http_requests_in_flight {self.in_flight}',
+                '# HELP http_request_duration_seconds HTTP request latency.',
+                '# TYPE http_request_duration_seconds histogram',
+                *_histogram_lines('http_request_duration_seconds', self.latency),
+                '# HELP http_request_db_seconds Time spent in SQL statements per HTTP request.',
+                '# TYPE http_request_db_seconds histogram',
+                *_histogram_lines('http_request_db_seconds', self.db_time),
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, metrics: RequestMetrics = request_metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        self.metrics.started()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # шаблон пути, а не сам путь: иначе число рядов росло бы с каждым id
+            route = scope.get('route')
+            self.metrics.finished(scope['method'], route.path if route else 'unmatched', status_code,
+                                  time.perf_counter() - started, stats.duration)
+            current_query_stats.reset(token)
+
+
+class QueryDebugMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or not settings.DEBUG:
+            await self.app(scope, receive, send)
+            return
+
+        stats = current_query_stats.get()
+        token = None
+        if stats is None:
+            stats = QueryStats()
+            token = current_query_stats.set(stats)
+
+        async def send_with_headers(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = MutableHeaders(scope=message)
+                headers['X-DB-Queries'] = str(stats.count)
+                headers['X-DB-Time'] = f'{stats.duration * 1000:.2f}'
+                repeated = stats.repeated(settings.REPEATED_QUERY_THRESHOLD)
+                if repeated:
+                    headers['X-DB-Repeated'] = str(len(repeated))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            for statement, count in stats.repeated(settings.REPEATED_QUERY_THRESHOLD).items():
+                logger.warning('Possible N+1: statement executed %s times during %s %s: %s', count, scope['method'],
+                               scope['path'], statement, extra={'event': 'repeated_query', 'count': count})
+            if token is not None:
+                current_query_stats.reset(token)
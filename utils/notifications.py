@@ -0,0 +1,71 @@
+import asyncio
+from collections import defaultdict
+from threading import Lock
+from typing import Iterable
+
+
+class Subscription:
+    def __init__(self, book_ids: Iterable[int]):
+        self.book_ids = frozenset(book_ids)
+        self.loop = asyncio.get_running_loop()
+        self.pending: dict[int, int] = {}
+        self.wakeup = asyncio.Event()
+
+    def _deliver(self, changes: dict[int, int]) -> None:
+        # непрочитанные изменения схлопываются до последнего значения по книге, очередь не растет
+        self.pending.update(changes)
+        self.wakeup.set()
+
+    def push(self, changes: dict[int, int]) -> None:
+        try:
+            self.loop.call_soon_threadsafe(self._deliver, changes)
+        except RuntimeError:
+            pass
+
+    async def changes(self, timeout: float) -> dict[int, int]:
+        try:
+            await asyncio.wait_for(self.wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self.wakeup.clear()
+        changes, self.pending = self.pending, {}
+        return changes
+
+
+class AvailabilityHub:
+    def __init__(self):
+        self._subscriptions: dict[int, set[Subscription]] = defaultdict(set)
+        self._lock = Lock()
+
+    def subscribe(self, book_ids: Iterable[int]) -> Subscription:
+        subscription = Subscription(book_ids)
+        with self._lock:
+            for book_id in subscription.book_ids:
+                self._subscriptions[book_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            for book_id in subscription.book_ids:
+                subscribers = self._subscriptions.get(book_id)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscriptions[book_id]
+
+    def publish(self, available_copies: dict[int, int]) -> None:
+        with self._lock:
+            targets = defaultdict(dict)
+            for book_id, copies in available_copies.items():
+                for subscription in self._subscriptions.get(book_id, ()):
+                    targets[subscription][book_id] = copies
+        for subscription, changes in targets.items():
+            subscription.push(changes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            subscriptions = set().union(*self._subscriptions.values())
+            return {'subscriptions': len(subscriptions), 'books': len(self._subscriptions)}
+
+
+availability = AvailabilityHub()
@@ -0,0 +1,47 @@
+from typing import Callable, Optional
+
+from fastapi import HTTPException, status
+from fastapi_pagination.cursor import decode_cursor, encode_cursor
+from sqlalchemy import Result, Select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, Session
+from app.api import schemas
+
+
+def decode_id_cursor(cursor: Optional[str]) -> Optional[int]:
+    try:
+        value = decode_cursor(cursor)
+        return int(value) if value else None
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor value')
+
+
+def _keyset_query(query: Select, key: InstrumentedAttribute, cursor: Optional[str], size: int) -> Select:
+    last_key = decode_id_cursor(cursor)
+    if last_key is not None:
+        query = query.where(key > last_key)
+    return query.order_by(key).limit(size + 1)
+
+
+def _keyset_page(query: Select, result: Result, key: InstrumentedAttribute, size: int,
+                 transformer: Callable[[list], list]) -> schemas.CursorPage:
+    rows = result.scalars().all() if len(query.column_descriptions) == 1 else result.all()
+
+    next_cursor = None
+    if len(rows) > size:
+        rows = rows[:size]
+        next_cursor = encode_cursor(str(getattr(rows[-1], key.key)))
+
+    return schemas.CursorPage(items=transformer(rows), size=size, next_cursor=next_cursor)
+
+
+def paginate_keyset(db: Session, query: Select, key: InstrumentedAttribute, cursor: Optional[str], size: int,
+                    transformer: Callable[[list], list]) -> schemas.CursorPage:
+    query = _keyset_query(query, key, cursor, size)
+    return _keyset_page(query, db.execute(query), key, size, transformer)
+
+
+async def paginate_keyset_async(db: AsyncSession, query: Select, key: InstrumentedAttribute, cursor: Optional[str],
+                                size: int, transformer: Callable[[list], list]) -> schemas.CursorPage:
+    query = _keyset_query(query, key, cursor, size)
+    return _keyset_page(query, await db.execute(query), key, size, transformer)
@@ -1,16 +1,24 @@
 import datetime
+import hashlib
+import time
 import jwt
+from anyio import CapacityLimiter, to_thread
+from anyio.lowlevel import RunVar
 from fastapi.security import OAuth2PasswordBearer
-from typing import List
+from typing import List, Optional, Tuple
 from fastapi import Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, object_session
 from starlette import status
 from app.core.config import settings
 from passlib.context import CryptContext
+from app.api import schemas
 from app.db import models
-from app.db.database import get_db
+from app.db.database import get_async_db, get_db
+from utils.cache import LRUCache
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
@@ -24,6 +32,38 @@ def verify_password(plain_password: str, hashed_password: str):
     return pwd_context.verify(plain_password, hashed_password)
 
 
+# bcrypt выполняется в отдельном лимите потоков, чтобы всплеск логинов не занимал пул потоков anyio
+_password_limiter: RunVar[CapacityLimiter] = RunVar('password_limiter')
+
+
+def password_limiter() -> CapacityLimiter:
+    try:
+        return _password_limiter.get()
+    except LookupError:
+        limiter = CapacityLimiter(settings.PASSWORD_HASH_WORKERS)
+        _password_limiter.set(limiter)
+        return limiter
+
+
+def password_pool_stats() -> dict:
+    statistics = password_limiter().statistics()
+    return {
+        'limit': statistics.total_tokens,
+        'busy': statistics.borrowed_tokens,
+        'queued': statistics.tasks_waiting,
+    }
+
+
+async def hash_password_async(password: str) -> str:
+    return await to_thread.run_sync(hash_password, password, limiter=password_limiter())
+
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    # второй элемент - новый хэш, если сохраненный сделан с другим числом раундов
+    return await to_thread.run_sync(pwd_context.verify_and_update, plain_password, hashed_password,
+                                    limiter=password_limiter())
+
+
 def create_access_token(data: dict, token_life_time: int = ACCESS_TOKEN_EXPIRE_MINUTES):
     expire = datetime.datetime.now(datetime.UTC) + datetime.timedelta(minutes=token_life_time)
     to_encode = data.copy()
@@ -32,10 +72,19 @@ def create_access_token(data: dict, token_life_time: int = ACCESS_TOKEN_EXPIRE_M
     return encoded_jwt
 
 
+decoded_tokens = LRUCache(settings.TOKEN_CACHE_SIZE)
+
+
 def verify_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    payload = decoded_tokens.get(digest)
+    if payload is not None:
+        return dict(payload)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
+        if 'exp' in payload:
+            decoded_tokens.put(digest, payload, expires_at=time.monotonic() + payload['exp'] - time.time())
+        return dict(payload)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail='Expired token')
     except jwt.InvalidTokenError:
@@ -44,6 +93,36 @@ def verify_token(token: str):
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
 
+verified_users = LRUCache(settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL)
+
+
+def _forget_on_commit(user: models.User, *usernames: str) -> None:
+    object_session(user).info.setdefault('forget_users', set()).update(usernames)
+
+
+@event.listens_for(models.User, 'after_update')
+def _user_updated(mapper, connection, user: models.User):
+    state = inspect(user)
+    username = state.attrs.username.history
+    if username.has_changes() or state.attrs.role.history.has_changes():
+        _forget_on_commit(user, user.username, *username.deleted)
+
+
+@event.listens_for(models.User, 'after_delete')
+def _user_deleted(mapper, connection, user: models.User):
+    _forget_on_commit(user, user.username)
+
+
+@event.listens_for(Session, 'after_commit')
+def _forget_users(session: Session):
+    for username in session.info.pop('forget_users', ()):
+        verified_users.pop(username)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _keep_users(session: Session):
+    session.info.pop('forget_users', None)
+
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
     payload = verify_token(token)
@@ -55,7 +134,7 @@ class RoleVerify:
     def __init__(self, roles: List[str]):
         self.roles = roles
 
-    def __call__(self, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    def verify_role(self, token: str) -> dict:
         payload = verify_token(token)
         role = payload.get('role')
         if role not in self.roles:
@@ -63,10 +142,41 @@ class RoleVerify:
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=f"Access denied. Required roles: {', '.join(self.roles)}"
             )
-        username = payload.get('sub')
-        if not db.query(models.User).filter(models.User.username == username).first():
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=f"User {username} does not exist"
-            )
         return payload
+
+    @staticmethod
+    def user_not_found(username: str) -> HTTPException:
+        return HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"User {username} does not exist"
+        )
+
+    def principal(self, payload: dict, user_id: int) -> schemas.Principal:
+        if payload.get('uid', user_id) != user_id:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid token')
+        return schemas.Principal(id=user_id, username=payload.get('sub'), role=payload.get('role'))
+
+    def __call__(self, db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)) -> schemas.Principal:
+        payload = self.verify_role(token)
+        username = payload.get('sub')
+        user_id = verified_users.get(username)
+        if user_id is None:
+            user_id = db.query(models.User.id).filter(models.User.username == username).scalar()
+            if user_id is None:
+                raise self.user_not_found(username)
+            verified_users.put(username, user_id)
+        return self.principal(payload, user_id)
+
+
+class AsyncRoleVerify(RoleVerify):
+    async def __call__(self, db: AsyncSession = Depends(get_async_db),
+                       token: str = Depends(oauth2_scheme)) -> schemas.Principal:
+        payload = self.verify_role(token)
+        username = payload.get('sub')
+        user_id = verified_users.get(username)
+        if user_id is None:
+            user_id = await db.scalar(select(models.User.id).where(models.User.username == username))
+            if user_id is None:
+                raise self.user_not_found(username)
+            verified_users.put(username, user_id)
+        return self.principal(payload, user_id)